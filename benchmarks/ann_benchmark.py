@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from memory.ann import IVFIndex
+from memory.semantic import SemanticMemory
+
+def clustered_vectors(rows, dim, clusters, rng, chunk=65536, out=None):
+    """Unit vectors scattered around random topics, like real fact embeddings (written to `out` if given)."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    matrix = np.empty((rows, dim), dtype=np.float32) if out is None else out
+    for start in range(0, rows, chunk):
+        end = min(start + chunk, rows)
+        topics = rng.integers(0, clusters, end - start)
+        block = centers[topics] + 0.6 * rng.standard_normal((end - start, dim), dtype=np.float32)
+        matrix[start:end] = SemanticMemory._normalize_rows(block)
+    return matrix
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF index query latency and recall vs exact search")
+    parser.add_argument("--facts", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = clustered_vectors(args.facts, args.dim, clusters=max(16, args.facts // 500), rng=rng)
+    rows = np.arange(args.facts)
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    index.train(matrix, rows)
+    build_seconds = time.perf_counter() - start
+
+    picks = rng.integers(0, args.facts, args.queries)
+    queries = SemanticMemory._normalize_rows(
+        matrix[picks] + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+    )
+
+    exact_times, truth = [], []
+    for query in queries:
+        start = time.perf_counter()
+        top = SemanticMemory._top_k(rows, matrix @ query, args.k)
+        exact_times.append(time.perf_counter() - start)
+        truth.append(set(top.tolist()))
+
+    results = {
+        "facts": args.facts,
+        "dim": args.dim,
+        "nlist": len(index.centroids),
+        "build_seconds": round(build_seconds, 2),
+        "exact_ms_p50": round(1000 * float(np.median(exact_times)), 3),
+        "ivf": [],
+    }
+    for nprobe in args.nprobe:
+        times, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            candidates, scores = index.candidates(matrix, query, nprobe=nprobe)
+            top = SemanticMemory._top_k(candidates, scores, args.k)
+            times.append(time.perf_counter() - start)
+            hits += len(expected & set(top.tolist()))
+        results["ivf"].append({
+            "nprobe": nprobe,
+            "ms_p50": round(1000 * float(np.median(times)), 3),
+            "ms_p99": round(1000 * float(np.percentile(times, 99)), 3),
+            "recall_at_k": round(hits / (args.k * len(queries)), 4),
+        })
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Timing fields in suite.py reports; larger is worse
+TIMING_SUFFIXES = ("_ms", "_seconds", "seconds", "us_per_call", "us_per_event")
+
+def timings(node, path=()):
+    """Yield (path, value) for every timing field, lists keyed by their size field."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "wall_seconds":
+                continue
+            if isinstance(value, (int, float)) and key.endswith(TIMING_SUFFIXES):
+                yield path + (key,), value
+            else:
+                yield from timings(value, path + (key,))
+    elif isinstance(node, list):
+        for item in node:
+            size = next((f"{k}={item[k]}" for k in ("events", "facts") if isinstance(item, dict) and k in item), None)
+            yield from timings(item, path + ((size,) if size else ()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports from suite.py")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = dict(timings(json.loads(args.baseline.read_text())["results"]))
+    current = dict(timings(json.loads(args.current.read_text())["results"]))
+    regressions = []
+    for path, before in baseline.items():
+        after = current.get(path)
+        if after is None or before <= 0:
+            continue
+        change = after / before - 1
+        line = f"{'/'.join(path)}: {before:g} -> {after:g} ({change:+.1%})"
+        if change > args.tolerance:
+            regressions.append(line)
+        print(line)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import requests
+from benchmarks.stub_server import StubOllama
+from core.http_client import HttpClient
+
+def requests_per_second(post, url, count):
+    payload = {"model": "nomic-embed-text", "input": "benchmark text"}
+    start = time.perf_counter()
+    for _ in range(count):
+        post(f"{url}/api/embed", json=payload, timeout=30).raise_for_status()
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding round-trips per second: bare requests vs pooled client")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    with StubOllama(dim=args.dim) as stub:
+        client = HttpClient()
+        results = {
+            "requests": args.requests,
+            "unpooled_rps": round(requests_per_second(requests.post, stub.url, args.requests), 1),
+            "pooled_rps": round(requests_per_second(client.post, stub.url, args.requests), 1),
+        }
+        client.close()
+    results["speedup"] = round(results["pooled_rps"] / results["unpooled_rps"], 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import requests
+from benchmarks.stub_server import StubOllama
+
+def percentile(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 2)
+
+def run_session(url, turns):
+    """One client: open a session and time each turn."""
+    client = requests.Session()
+    session = client.post(f"{url}/sessions", json={}).json()["session"]
+    latencies = []
+    for turn in range(turns):
+        started = time.perf_counter()
+        response = client.post(f"{url}/sessions/{session}/messages", json={"message": f"I prefer option {turn}"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    client.close()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency of the agent server at N concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--facts", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub adds to every Ollama call")
+    parser.add_argument("--sleep-every", type=float, default=0.0, help="run a consolidation every N seconds (0: never)")
+    args = parser.parse_args()
+
+    # Memory files go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="server-benchmark-"))
+    from core.agent import LivingAgent
+    from core.server import AgentServer
+
+    with StubOllama(dim=args.dim, latency=args.latency) as stub:
+        agent = LivingAgent(model="stub", ollama_url=stub.url, stage_workers=args.sessions)
+        agent.semantic.add_many([f"User fact: benchmark fact {i}" for i in range(args.facts)])
+        agent.semantic.embed_missing(batch_size=256)
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        server = AgentServer(agent, port=0, workers=2 * args.sessions)
+        asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+        url = f"http://127.0.0.1:{server.port}"
+
+        # Optional background consolidation while the sessions talk
+        done = threading.Event()
+        def sleeper():
+            while not done.wait(args.sleep_every):
+                requests.post(f"{url}/sleep", json={}).raise_for_status()
+        sleep_thread = threading.Thread(target=sleeper, daemon=True)
+        if args.sleep_every:
+            sleep_thread.start()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as clients:
+            results = list(clients.map(run_session, [url] * args.sessions, [args.turns] * args.sessions))
+        elapsed = time.perf_counter() - started
+        done.set()
+
+        latencies = [latency for session in results for latency in session]
+        print(json.dumps({
+            "sessions": args.sessions,
+            "turns": len(latencies),
+            "facts": args.facts,
+            "stub_latency_ms": args.latency * 1000,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+            "mean_ms": round(float(np.mean(latencies)) * 1000, 2),
+            "turns_per_second": round(len(latencies) / elapsed, 1),
+            "sleeps": server.sleeps,
+        }, indent=2))
+
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+class _StubServer:
+    """Threaded keep-alive HTTP server on a free local port; subclasses provide the handler."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency  # seconds added to every request
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _served(self):
+        """Count a request and apply the configured latency."""
+        with self._count_lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _handler(self):
+        raise NotImplementedError
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients can reuse connections
+    disable_nagle_algorithm = True  # like Ollama; avoids delayed-ACK stalls on reused connections
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StubOllama(_StubServer):
+    """
+    Local stand-in for Ollama so benchmarks need no network or model.
+    Embeddings are deterministic per text; generation returns a fixed reply,
+    streamed as NDJSON when asked to. Counts every request it serves.
+    """
+
+    REPLY = ["I", " remember", " that", " about", " you", "."]
+
+    def __init__(self, dim=768, latency=0.0):
+        self.dim = dim
+        super().__init__(latency=latency)
+
+    def embedding(self, text: str) -> list:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(_JSONHandler):
+            def _stream(self, chunks):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    line = json.dumps(chunk).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_POST(self):
+                stub._served()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                if self.path == "/api/embed":
+                    inputs = body.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({"model": body.get("model"), "embeddings": [stub.embedding(t) for t in inputs]})
+                elif self.path == "/api/generate":
+                    final = {
+                        "done": True,
+                        "context": [1, 2, 3],
+                        "prompt_eval_count": len(body.get("prompt", "")) // 4,
+                        "prompt_eval_duration": 1_000_000,
+                        "eval_count": len(stub.REPLY),
+                        "eval_duration": 2_000_000,
+                    }
+                    if body.get("stream", True):
+                        chunks = [{"response": token, "done": False} for token in stub.REPLY]
+                        self._stream(chunks + [dict(final, response="")])
+                    else:
+                        self._send_json(dict(final, response="".join(stub.REPLY)))
+                else:
+                    self.send_error(404)
+
+        return Handler
+
+class StubDuckDuckGo(_StubServer):
+    """
+    Local stand-in for the DuckDuckGo instant-answer API (GET /?q=...&format=json).
+    Returns an abstract and a few related topics derived from the query.
+    """
+
+    def __init__(self, topics=3, latency=0.0):
+        self.topics = topics
+        super().__init__(latency=latency)
+
+    def answer(self, query: str) -> dict:
+        return {
+            "Heading": query.title(),
+            "AbstractText": f"{query} is described here in a short summary paragraph.",
+            "AbstractURL": "https://example.com/" + query.replace(" ", "_"),
+            "RelatedTopics": [
+                {"Text": f"{query}, related topic {i}", "FirstURL": f"https://example.com/{query.replace(' ', '_')}_{i}"}
+                for i in range(self.topics)
+            ],
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(_JSONHandler):
+            def do_GET(self):
+                stub._served()
+                query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                self._send_json(stub.answer(query))
+
+        return Handler
@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from benchmarks.ann_benchmark import clustered_vectors
+from benchmarks.stub_server import StubDuckDuckGo, StubOllama
+from core.http_client import HttpClient
+from memory.ann import IVFIndex
+from memory.consolidation import consolidate
+from memory.episodic import EpisodicMemory
+from memory.lexical import BM25Index
+from memory.lifecycle import ColdStore, MemoryLifecycle
+from memory.salience import estimate_salience
+from memory.semantic import SemanticMemory
+
+SECTIONS = ["salience", "consolidate", "retrieve", "lifecycle", "persistence", "startup", "respond"]
+
+MESSAGES = [
+    "My name is Alice and I work as a data engineer",
+    "I prefer tea to coffee in the mornings",
+    'Please remember the passphrase "blue falcon"',
+    "I always go running before work",
+    "What is the weather like in Paris today?",
+    "ok thanks",
+    "This is really important: my flight is on Friday",
+    "I usually read science fiction before bed",
+]
+
+def summary(seconds: list) -> dict:
+    """Latency distribution in milliseconds."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+@contextmanager
+def scratch_dir(prefix: str):
+    """Run the block inside a new temporary directory; afterwards the old cwd is back and the directory is gone."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=prefix, ignore_cleanup_errors=True) as path:
+        os.chdir(path)
+        try:
+            yield Path(path)
+        finally:
+            os.chdir(cwd)
+
+def history(count: int, start=1.7e9) -> list:
+    """Synthetic episodic events with realistic salience scores, one per second."""
+    return [
+        {"time": start + i, "content": f"{MESSAGES[i % len(MESSAGES)]} ({i})", "salience": estimate_salience(MESSAGES[i % len(MESSAGES)])}
+        for i in range(count)
+    ]
+
+def bench_salience(args, stubs) -> dict:
+    messages = MESSAGES * (args.salience_calls // len(MESSAGES))
+    seconds, _ = timed(lambda: [estimate_salience(m) for m in messages])
+    return {"calls": len(messages), "us_per_call": round(seconds / len(messages) * 1e6, 3)}
+
+def bench_consolidate(args, stubs) -> dict:
+    results = []
+    for size in args.history:
+        events = history(size)
+        seconds, facts = timed(consolidate, events)
+        results.append({"events": size, "seconds": round(seconds, 4), "facts": len(facts)})
+    return {"runs": results}
+
+def populated_memory(size: int, dim: int, url: str, http) -> SemanticMemory:
+    """SemanticMemory holding `size` facts with clustered vectors, written straight into its matrix."""
+    semantic = SemanticMemory(ollama_url=url, index=IVFIndex(), http=http)
+    semantic.add_many([f"User fact: synthetic fact number {i}" for i in range(size)])
+    semantic._matrix = np.zeros((len(semantic._embedded), dim), dtype=np.float32)
+    clustered_vectors(size, dim, clusters=max(16, size // 500), rng=np.random.default_rng(0), out=semantic._matrix[:size])
+    semantic._embedded[:size] = True
+    return semantic
+
+def bench_retrieve(args, stubs) -> dict:
+    ollama = stubs["ollama"]
+    http = HttpClient()
+    results = []
+    for size in args.facts:
+        semantic = populated_memory(size, ollama.dim, ollama.url, http)
+        build_seconds, _ = timed(lambda: (semantic._index_rows(np.arange(size)), semantic.train_index()))
+        run = {"facts": size, "index_build_seconds": round(build_seconds, 3), "index_trained": semantic.index.trained}
+        for mode, exact in (("exact", True), ("indexed", False)):
+            if mode == "indexed" and not semantic.index.trained:
+                continue
+            # A fresh query each time, so every call also embeds it (one stub round trip)
+            times = [timed(semantic.retrieve_relevant, f"{mode} query {i}", 10, exact)[0] for i in range(args.queries)]
+            run[mode] = summary(times)
+        if size <= args.lexical_max:
+            # Keyword index on its own and combined with the vectors
+            semantic.lexical = BM25Index()
+            build_seconds, _ = timed(lambda: [semantic.lexical.add(row, fact) for row, fact in enumerate(semantic.facts)])
+            run["lexical_build_seconds"] = round(build_seconds, 3)
+            for mode in ("lexical", "prefilter", "rrf"):
+                semantic.fusion = mode
+                times = [timed(semantic.retrieve_relevant, f"{mode} fact number {i * 7}", 10)[0] for i in range(args.queries)]
+                run[mode] = summary(times)
+        results.append(run)
+        del semantic
+    http.close()
+    return {"dim": stubs["ollama"].dim, "runs": results}
+
+def bench_lifecycle(args, stubs) -> dict:
+    """Retrieval with the hot tier capped at --hot-facts, as the total number of facts grows."""
+    ollama = stubs["ollama"]
+    http = HttpClient()
+    results = []
+    for size in args.lifecycle_facts:
+        with scratch_dir("bench-cold-") as cold_dir:
+            semantic = populated_memory(size, ollama.dim, ollama.url, http)
+            semantic.cold = ColdStore(cold_dir)
+            lifecycle = MemoryLifecycle(EpisodicMemory(), semantic, semantic.cold, max_hot_facts=args.hot_facts)
+            evict_seconds, moved = timed(lifecycle.run)
+            # Unrelated queries: nothing hot is relevant, so each one also probes the cold tier
+            times = [timed(semantic.retrieve_relevant, f"lifecycle query {i}", 10, True)[0] for i in range(args.queries)]
+            results.append({
+                "facts": size,
+                "evict_seconds": round(evict_seconds, 3),
+                "hot_facts": len(semantic.facts),
+                "cold_facts": moved["facts"],
+                "cold_bytes": semantic.cold.stats()["bytes"],
+                "retrieve": summary(times),
+            })
+            del semantic, lifecycle
+    http.close()
+    return {"hot_facts": args.hot_facts, "runs": results}
+
+def bench_persistence(args, stubs) -> dict:
+    from core.agent import LivingAgent
+
+    results = []
+    for size in args.history:
+        with scratch_dir("bench-state-"):
+            agent = LivingAgent(ollama_url=stubs["ollama"].url)
+            events = history(size)
+            start = time.perf_counter()
+            for event in events:
+                agent.episodic.store(event["content"], event["salience"])
+            store_seconds = time.perf_counter() - start
+            agent.semantic.add_many([f"User fact: remembered detail {i}" for i in range(size // 10)])
+            agent.semantic.embed_missing(batch_size=256)
+
+            save_seconds, _ = timed(agent.save_state)
+            agent.journal.close()
+            reloaded = LivingAgent(ollama_url=stubs["ollama"].url)
+            load_seconds, _ = timed(reloaded.load_state)
+            reloaded.journal.close()
+            results.append({
+                "events": size,
+                "facts": size // 10,
+                "store_us_per_event": round(store_seconds / size * 1e6, 2),
+                "save_state_seconds": round(save_seconds, 4),
+                "load_state_seconds": round(load_seconds, 4),
+                "snapshot_bytes": Path("storage/agent_state.snapshot.jsonl").stat().st_size,
+            })
+    return {"runs": results}
+
+# Run in a fresh interpreter so module imports are part of the measurement
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from core.agent import LivingAgent
+imported = time.perf_counter()
+agent = LivingAgent(ollama_url={url!r})
+agent.load_state(background={background})
+ready = time.perf_counter()
+agent.wait_loaded()
+print(json.dumps({{"import": imported - started, "ready": ready - started, "loaded": time.perf_counter() - started}}))
+"""
+
+def bench_startup(args, stubs) -> dict:
+    """Time from process start to an interactive agent, loading saved state up front or in the background."""
+    from core.agent import LivingAgent
+
+    root = str(Path(__file__).parent.parent)
+    results = []
+    for size in args.startup_events:
+        with scratch_dir("bench-startup-"):
+            agent = LivingAgent(ollama_url=stubs["ollama"].url)
+            agent.episodic.load(history(size), watermark=size)
+            agent.semantic.add_many([f"User fact: remembered detail {i}" for i in range(size // 10)])
+            agent.semantic.embed_missing(batch_size=256)
+            agent.journal.compact(*agent._snapshot())
+            agent.save_state()
+            agent.journal.close()
+            del agent
+
+            run = {"events": size, "facts": size // 10, "snapshot_bytes": Path("storage/agent_state.snapshot.jsonl").stat().st_size}
+            for mode, background in (("foreground", False), ("background", True)):
+                script = STARTUP_SCRIPT.format(root=root, url=stubs["ollama"].url, background=background)
+                times = [
+                    json.loads(subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout)
+                    for _ in range(args.startup_runs)
+                ]
+                run[mode] = {
+                    stage + "_seconds": round(float(np.median([t[stage] for t in times])), 4)
+                    for stage in ("import", "ready", "loaded")
+                }
+            results.append(run)
+    return {"runs": results}
+
+def bench_respond(args, stubs) -> dict:
+    from core.agent import LivingAgent
+
+    with scratch_dir("bench-respond-"):
+        agent = LivingAgent(ollama_url=stubs["ollama"].url)
+        agent.search.duckduckgo_url = stubs["duckduckgo"].url
+        agent.semantic.add_many([f"User fact: remembered detail {i}" for i in range(args.respond_facts)])
+        agent.semantic.embed_missing(batch_size=256)
+
+        def turns(messages):
+            times = []
+            for message in messages:
+                agent.observe(message)
+                times.append(timed(agent.respond)[0])
+            return summary(times)
+
+        result = {
+            "facts": args.respond_facts,
+            "chat": turns([f"I enjoyed the concert number {i}" for i in range(args.turns)]),
+            # Search-triggering questions: new ones miss the search cache, repeats hit it
+            "search_miss": turns([f"what is topic {i}" for i in range(args.turns)]),
+            "search_hit": turns([f"what is topic {i}" for i in range(args.turns)]),
+        }
+        agent.journal.close()
+        return result
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the memory and agent hot paths against local stub servers")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--facts", type=int, nargs="+", default=[1_000, 100_000, 1_000_000], help="retrieval sizes")
+    parser.add_argument("--history", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="episodic history sizes")
+    parser.add_argument("--lifecycle-facts", type=int, nargs="+", default=[10_000, 100_000, 300_000],
+                        help="total facts for the lifecycle section")
+    parser.add_argument("--hot-facts", type=int, default=5_000, help="hot-tier limit in the lifecycle section")
+    parser.add_argument("--startup-events", type=int, nargs="+", default=[10_000, 100_000, 500_000],
+                        help="saved history sizes for the startup section (with a tenth as many facts)")
+    parser.add_argument("--startup-runs", type=int, default=3, help="processes started per size and mode")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--lexical-max", type=int, default=100_000, help="largest size to time keyword retrieval at")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--respond-facts", type=int, default=1_000)
+    parser.add_argument("--salience-calls", type=int, default=20_000)
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+    if args.quick:
+        args.facts, args.history, args.lifecycle_facts = [1_000, 10_000], [1_000, 5_000], [10_000, 30_000]
+        args.startup_events, args.startup_runs = [1_000, 10_000], 1
+        args.queries, args.turns, args.salience_calls = 20, 10, 2_000
+    if args.output is not None:
+        args.output = args.output.resolve()
+
+    report = {"environment": environment(), "results": {}}
+    with StubOllama(dim=args.dim) as ollama, StubDuckDuckGo() as duckduckgo:
+        stubs = {"ollama": ollama, "duckduckgo": duckduckgo}
+        for section in SECTIONS:
+            if section in args.only:
+                seconds, report["results"][section] = timed(globals()[f"bench_{section}"], args, stubs)
+                report["results"][section]["wall_seconds"] = round(seconds, 2)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,104 @@
-import requests
+import contextvars
 import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 from datetime import datetime
+from core.cache import TTLCache
+from core.http_client import get_client
+from core.prompt import PromptBuilder
 from core.state import WorkingState
 from core.search import InternetSearch
-from memory.episodic import EpisodicMemory
+from core.tracing import JSONLSink, Metrics, Tracer
+from memory.episodic import EpisodicMemory, EventColumns
 from memory.semantic import SemanticMemory
+from memory.ann import IVFIndex
+from memory.lexical import BM25Index
+from memory.lifecycle import ColdStore, MemoryLifecycle
+from memory.consolidation import Consolidator, fact_category
 from memory.salience import estimate_salience
-from storage.db import save, load
+from storage.db import MemoryDB, DBEmbeddingStore
+from storage.journal import Journal
 
 AGENT_STATE_FILE = Path("storage/agent_state.json")
+EMBEDDING_STORE_DIR = AGENT_STATE_FILE.parent / "embeddings"
+SEMANTIC_INDEX_FILE = AGENT_STATE_FILE.parent / "semantic_index.npz"
+SEARCH_CACHE_FILE = AGENT_STATE_FILE.parent / "search_cache.json"
+# Append-only log of memory changes and the snapshot it is compacted into
+SNAPSHOT_FILE = AGENT_STATE_FILE.parent / "agent_state.snapshot.jsonl"
+JOURNAL_FILE = AGENT_STATE_FILE.parent / "agent_state.journal.jsonl"
+# Compressed segments of the memories evicted from RAM
+COLD_DIR = AGENT_STATE_FILE.parent / "cold"
+
+# How long Ollama keeps the model (and its cached prompt prefix) loaded between turns
+KEEP_ALIVE = "30m"
+
+# Seconds each prompt stage may take (measured from the start of the turn)
+# before the prompt is built without its section
+STAGE_BUDGETS = {"memory": 5.0, "search": 8.0}
+
+# Ollama's own counters from the final /api/generate response (durations in nanoseconds)
+GENERATION_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
 
 class LivingAgent:
-    def __init__(self, model="llama2", ollama_url="http://localhost:11434"):
+    def __init__(self, model="llama2", ollama_url="http://localhost:11434", http=None, db_path=None, stage_workers=4,
+                 trace_file=None):
+        self.http = http or get_client()
+        # Per-stage histograms and counters, plus a JSONL span trace when trace_file is given
+        self.metrics = Metrics()
+        self.tracer = Tracer([self.metrics] + ([JSONLSink(trace_file)] if trace_file is not None else []))
+        # With db_path, memories live in SQLite (storage.db); otherwise in the journal files
+        self.db = MemoryDB(db_path) if db_path is not None else None
+        self.journal = self.db if self.db is not None else Journal(SNAPSHOT_FILE, JOURNAL_FILE)
         self.state = WorkingState()
-        self.episodic = EpisodicMemory()
-        self.semantic = SemanticMemory(ollama_url=ollama_url)
-        self.search = InternetSearch()
+        self.episodic = EpisodicMemory(backend=self.db)
+        self.consolidator = Consolidator()  # per-category state carried from one sleep to the next
+        self.semantic = SemanticMemory(
+            ollama_url=ollama_url,
+            store_dir=EMBEDDING_STORE_DIR if self.db is None else None,
+            index=IVFIndex(),
+            lexical=BM25Index(),
+            http=self.http,
+        )
+        if self.db is not None:
+            self.semantic.store = DBEmbeddingStore(self.db, self.semantic.embedding_model)
+        self.semantic.tracer = self.tracer
+        self._attach_journal(self.journal)
+        self.search = InternetSearch(
+            http=self.http,
+            cache=TTLCache(max_entries=256, ttl=3600, negative_ttl=300, stale_ttl=86400, path=SEARCH_CACHE_FILE),
+        )
+        self.search.tracer = self.tracer
+        # Bounded hot tier: least valuable memories move to COLD_DIR after each sleep
+        self.cold = ColdStore(COLD_DIR)
+        self.semantic.cold = self.cold
+        self.lifecycle = MemoryLifecycle(self.episodic, self.semantic, self.cold)
         self.model = model
         self.ollama_url = ollama_url
+        self.stage_budgets = dict(STAGE_BUDGETS)
+        self.prompt_builder = PromptBuilder()  # token budgets per prompt section
+        self.keep_alive = KEEP_ALIVE
+        self._stages = ThreadPoolExecutor(max_workers=stage_workers, thread_name_prefix="agent-stage")
+        self._sleep_lock = threading.RLock()  # one consolidation at a time
+        self.last_activity = time.time()  # of the latest message, for idle-time sleeps
+        # Set while no background load_state() is running
+        self._loaded = threading.Event()
+        self._loaded.set()
 
-    def observe(self, user_input):
-        self.state.add("user", user_input)
-        salience = estimate_salience(user_input)
-        self.episodic.store(user_input, salience)
+    def observe(self, user_input, state=None):
+        """Record a user message in working memory (the agent's own, or a session's) and episodic memory."""
+        with self.tracer.span("observe") as span:
+            (state or self.state).add("user", user_input)
+            self.last_activity = time.time()
+            salience = span["salience"] = estimate_salience(user_input)
+            self.episodic.store(user_input, salience)
 
-    def respond(self):
-        """Generate response using local Ollama model with semantic memory and internet search."""
-        context = self.state.context()
-        
-        # Build conversation history for context
-        conversation = "\n".join([
-            f"{msg['role'].upper()}: {msg['content']}"
-            for msg in context
-        ])
+    def _build_prompt(self, state=None):
+        """Assemble the generation prompt from memories, search results and the conversation."""
+        state = state or self.state
+        context = state.context()
         
         # Get the last user message
         last_user_msg = next(
@@ -44,101 +109,391 @@ class LivingAgent:
         # Get current date
         current_date = datetime.now().strftime("%B %d, %Y")
         
-        # Retrieve relevant semantic memories
-        relevant_memories = self.semantic.retrieve_relevant(last_user_msg)
-        
-        # Build memory section
-        memory_section = ""
-        if relevant_memories:
-            memory_section = "\n=== PERSISTENT KNOWLEDGE FROM ALL PAST CONVERSATIONS ===\n" + "\n".join(
-                f"• {fact}" for fact in relevant_memories
-            ) + "\n=== END OF PERSISTENT KNOWLEDGE ===\n"
-        
-        # Check if we should search the internet for this query
-        search_section = ""
-        search_performed = False
-        if self.search.should_search(last_user_msg):
-            search_results = self.search.search(last_user_msg, max_results=3)
-            if search_results:
-                search_section = "\n" + search_results
-                search_performed = True
-        
-        # Create the final prompt with all context
-        # Be VERY explicit if search was performed
-        search_instruction = ""
-        if search_performed:
-            search_instruction = "\nIMPORTANT: I have searched the internet for current information above. You MUST use the search results provided. Do not talk about your training data or knowledge cutoff - use the search results instead.\n"
+        # Retrieve relevant semantic memories and search the internet concurrently
+        # Kept on the conversation's state, as sessions build prompts concurrently
+        timings = state.timings = {}
+        timed_out = state.timed_out = []
+        started = time.perf_counter()
+        # Each stage runs in a copy of this context, so its spans nest under the turn's
+        memory_stage = self._stages.submit(
+            contextvars.copy_context().run, self._run_stage, timings, "memory", self.semantic.retrieve_relevant,
+            last_user_msg, self.prompt_builder.max_memories,
+        )
+        search_stage = self._stages.submit(
+            contextvars.copy_context().run, self._run_stage, timings, "search", self._search_results, last_user_msg,
+        )
+        relevant_memories = self._stage_result("memory", memory_stage, started, [], timed_out)
+        search_results = self._stage_result("search", search_stage, started, "", timed_out)
+        prompt_started = time.perf_counter()
         
-        prompt = f"""You are a helpful assistant with persistent long-term memory and access to current internet information.
-
-CURRENT DATE: {current_date}
+        # Each section is cut to its token budget; the static instructions come first
+        with self.tracer.span("prompt") as span:
+            prompt = self.prompt_builder.build(current_date, relevant_memories, search_results, context)
+            span["chars"] = len(prompt)
+            span["tokens"] = dict(self.prompt_builder.last_usage)
+        timings["prompt"] = time.perf_counter() - prompt_started
+        return prompt
 
-{memory_section}{search_section}{search_instruction}CURRENT CONVERSATION:
-{conversation}
+    def _search_results(self, query):
+        """Search the internet if the query calls for it; empty string otherwise."""
+        if self.search.should_search(query):
+            return self.search.search(query, max_results=3)
+        return ""
 
-INSTRUCTIONS:
-1. The current date is {current_date}
-2. If search results are provided above, ALWAYS base your answer on those results
-3. Use persistent knowledge for personal facts about the user
-4. When answering, cite sources: "According to the search results...", "I found that..."
-5. Do NOT mention your training data or knowledge cutoff
-6. Do NOT say you don't have access to real-time information if search results are provided
-7. Answer naturally and conversationally
-8. Be factual and accurate
+    @staticmethod
+    def _run_stage(timings, name, func, *args):
+        """Run one prompt stage and record how long it took in its turn's timings."""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = time.perf_counter() - started
 
-Respond to the user's last message."""
-        
+    def _stage_result(self, name, future, started, default, timed_out):
+        """Wait for a stage within what is left of its budget; fall back to default (noted in timed_out)."""
+        remaining = self.stage_budgets.get(name, 0) - (time.perf_counter() - started)
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                assistant_response = result.get("response", "").strip()
-                
-                # Store the response in working memory
-                self.state.add("assistant", assistant_response)
-                
-                return assistant_response if assistant_response else "I'm thinking..."
-            else:
-                return f"Error: Ollama returned status {response.status_code}"
-        
-        except requests.exceptions.ConnectionError:
-            return "Error: Cannot connect to Ollama. Is it running on http://localhost:11434?"
+            return future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            # The stage keeps running in the background; this turn goes on without it
+            timed_out.append(name)
+            self.tracer.count(f"stage_timeouts.{name}")
+            return default
         except Exception as e:
-            return f"Error: {str(e)}"
+            print(f"Warning: {name} stage failed: {e}")
+            return default
+
+    def respond(self, state=None):
+        """Generate response using local Ollama model with semantic memory and internet search."""
+        import requests  # imported on the first turn rather than at startup
+
+        state = state or self.state
+        with self.tracer.span("turn", stream=False):
+            prompt = self._build_prompt(state)
+            generate_started = time.perf_counter()
+
+            try:
+                with self.tracer.span("generate") as span:
+                    response = self.http.post(
+                        f"{self.ollama_url}/api/generate",
+                        json={
+                            "model": self.model,
+                            "prompt": prompt,
+                            "stream": False,
+                            "keep_alive": self.keep_alive
+                        },
+                        timeout=60
+                    )
+                    span["status"] = response.status_code
+
+                    if response.status_code == 200:
+                        result = response.json()
+                        self._record_generation(span, result, state)
+                
+                if response.status_code == 200:
+                    assistant_response = result.get("response", "").strip()
+                    state.timings["generate"] = time.perf_counter() - generate_started
+                    
+                    # Store the response in working memory
+                    state.add("assistant", assistant_response)
+                    
+                    return assistant_response if assistant_response else "I'm thinking..."
+                else:
+                    return f"Error: Ollama returned status {response.status_code}"
+            
+            except requests.exceptions.ConnectionError:
+                return "Error: Cannot connect to Ollama. Is it running on http://localhost:11434?"
+            except Exception as e:
+                return f"Error: {str(e)}"
+
+    def respond_stream(self, state=None):
+        """
+        Generate a response like respond(), yielding tokens as Ollama produces them.
+        The full text is added to working memory once the stream ends.
+        """
+        import requests  # imported on the first turn rather than at startup
+
+        state = state or self.state
+        with self.tracer.span("turn", stream=True):
+            prompt = self._build_prompt(state)
+            generate_started = time.perf_counter()
+            tokens = []
+
+            try:
+                with self.tracer.span("generate") as span, self.http.post(
+                    f"{self.ollama_url}/api/generate",
+                    json={
+                        "model": self.model,
+                        "prompt": prompt,
+                        "stream": True,
+                        "keep_alive": self.keep_alive
+                    },
+                    stream=True,
+                    timeout=60
+                ) as response:
+                    span["status"] = response.status_code
+                    if response.status_code != 200:
+                        yield f"Error: Ollama returned status {response.status_code}"
+                        return
+
+                    # Ollama streams one JSON object per line
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        token = chunk.get("response", "")
+                        if token:
+                            if not tokens:
+                                first_token = state.timings["first_token"] = time.perf_counter() - generate_started
+                                span["first_token_ms"] = first_token * 1000
+                            tokens.append(token)
+                            yield token
+                        if chunk.get("done"):
+                            # The final chunk carries Ollama's timings
+                            self._record_generation(span, chunk, state)
+                            break
+                state.timings["generate"] = time.perf_counter() - generate_started
+
+                if not "".join(tokens).strip():
+                    yield "I'm thinking..."
+
+            except requests.exceptions.ConnectionError:
+                yield "Error: Cannot connect to Ollama. Is it running on http://localhost:11434?"
+            except Exception as e:
+                yield f"Error: {str(e)}"
+            finally:
+                # Also runs if the caller stops early, keeping whatever was shown
+                if tokens:
+                    state.add("assistant", "".join(tokens).strip())
+
+    def _record_generation(self, span, result, state):
+        """Keep Ollama's own counters for this turn and feed its durations to the metrics."""
+        state.generation = {field: result[field] for field in GENERATION_FIELDS if field in result}
+        span.update(state.generation)
+        if "prompt_eval_duration" in result:
+            self.tracer.observe("ollama.prompt_eval", result["prompt_eval_duration"] / 1e6)
+        if "eval_duration" in result:
+            self.tracer.observe("ollama.eval", result["eval_duration"] / 1e6)
+
+    async def respond_stream_async(self, state=None):
+        """Async version of respond_stream(); the HTTP stream is read in a worker thread."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+
+        def produce():
+            try:
+                for token in self.respond_stream(state):
+                    loop.call_soon_threadsafe(queue.put_nowait, token)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        producer = loop.run_in_executor(None, produce)
+        while True:
+            token = await queue.get()
+            if token is finished:
+                break
+            yield token
+        await producer
     
+    def sleep(self, threshold=0.15):
+        """
+        Consolidate the high-salience events stored since the last sleep into
+        semantic memory and save. Each updated category's facts are replaced
+        by its new fact; remembered phrases accumulate.
+        Returns (events consolidated, facts added).
+        """
+        with self._sleep_lock:
+            # Events stored while this sleep runs are left for the next one
+            upto = len(self.episodic.events)
+            events = self.episodic.sample_for_sleep(threshold=threshold, since_last_sleep=True, upto=upto)
+            # The consolidator's own state only moves on once the facts are in
+            # semantic memory: if anything below fails, the next sleep retries
+            changes, consolidated = self.consolidator.plan(events)
+            abstracted = [fact for _, fact, _ in changes]
+
+            # Build the update off to the side (embedding the new facts first),
+            # then swap it into semantic memory in one step: turns in flight
+            # keep answering from the old facts until then
+            embeddings = self.semantic.embeddings_for(abstracted) if abstracted else {}
+            self.semantic.update(
+                replacements={category: [fact] for category, fact, _ in changes if category != "memory"},
+                additions=[(fact, category) for category, fact, _ in changes if category == "memory"],
+                embeddings=embeddings,
+            )
+            self.episodic.mark_slept(upto)
+            if events:
+                self.consolidator.commit(consolidated)
+
+            # Keep RAM bounded; evicted events leave the journal through a compaction
+            moved = self.lifecycle.run()
+            if self.db is None and (moved["events"] or moved["facts"]):
+                self.journal.compact(*self._snapshot())
+            # Clustering a large memory takes seconds; doing it here keeps it off the turn path
+            self.semantic.train_index()
+            self.semantic.compact_lexical()
+            self.save_state()
+            return events, abstracted
+
     def save_state(self):
-        """Save agent state (memories) to disk for persistence across sessions."""
-        state_data = {
-            "semantic_memory": self.semantic.all(),
-            "episodic_memory": self.episodic.events,
-            "working_memory": self.state.context()
-        }
-        AGENT_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        AGENT_STATE_FILE.write_text(json.dumps(state_data, indent=2))
-    
-    def load_state(self):
-        """Load agent state (memories) from disk if it exists."""
-        if AGENT_STATE_FILE.exists():
-            state_data = json.loads(AGENT_STATE_FILE.read_text())
-            
-            # Load semantic memory
-            for fact in state_data.get("semantic_memory", []):
-                self.semantic.add(fact)
-            
-            # Load episodic memory
-            for event in state_data.get("episodic_memory", []):
-                self.episodic.events.append(event)
-            
-            # Don't load working memory (keep it fresh for new session)
+        """
+        Save agent state (memories) to disk for persistence across sessions.
+        Memory changes are already in the journal, so this only flushes it and
+        compacts it into a snapshot once enough changes have accumulated.
+        """
+        self.journal.flush()
+        if self.db is None:
+            self.journal.maybe_compact(self._snapshot)
+        self.semantic.save_index(SEMANTIC_INDEX_FILE)
+        self.search.cache.save()
+
+    def _snapshot(self):
+        """
+        Snapshot records of the current memories and the journal sequence
+        number they are consistent with. Memory changes are journaled under
+        the memories' locks, so none can slip in between the two.
+        """
+        with self._sleep_lock, self.semantic._lock, self.episodic._lock:
+            return list(self._snapshot_records()), self.journal.seq
+
+    def _snapshot_records(self):
+        """Journal records that rebuild the current memories from scratch."""
+        yield from self.semantic.fact_records()
+        for event in self.episodic.events:
+            yield dict(event, op="episode")
+        if self.db is None and self.episodic.watermark:
+            yield {"op": "slept", "watermark": self.episodic.watermark}
+        if self.db is None and (self.consolidator.latest or self.consolidator.phrases):
+            yield {"op": "consolidator", "state": self.consolidator.state()}
+
+    def _attach_journal(self, journal):
+        self.semantic.journal = journal
+        self.consolidator.journal = journal
+        if self.db is None:
+            # A database-backed EpisodicMemory writes its events itself
+            self.episodic.journal = journal
+
+    def load_state(self, background=False):
+        """
+        Load agent state (memories) from disk if it exists.
+
+        With background=True this returns at once and the memories are read
+        in a worker thread, which holds each memory's lock until that memory
+        is complete: a script can show its prompt immediately, and the first
+        call that needs a memory (observe, a retrieval, sleep, save_state)
+        waits only for it. Facts without a stored vector are embedded after
+        the locks are released. wait_loaded() blocks until all of it is done.
+        """
+        if self.db is not None:
+            if not self.db.count_facts() and not self.db.count_events():
+                return False
+        elif not self.journal.exists() and not AGENT_STATE_FILE.exists():
+            return False
+        self.search.cache.load()
+
+        # Don't load working memory (keep it fresh for new session)
+        if not background:
+            self._hydrate()
             return True
-        return False
+        locked = threading.Event()
+
+        def hydrate():
+            # Same lock order as _snapshot(); _hydrate() releases each one early
+            held = [self._sleep_lock, self.semantic._lock, self.episodic._lock]
+            for lock in held:
+                lock.acquire()
+            locked.set()
+
+            def release(*locks):
+                for lock in locks:
+                    held.remove(lock)
+                    lock.release()
+
+            try:
+                self._hydrate(release)
+            except Exception as e:
+                print(f"Warning: Could not load saved memories: {e}")
+            finally:
+                release(*reversed(held))
+                self._loaded.set()
+
+        self._loaded.clear()
+        threading.Thread(target=hydrate, name="agent-load", daemon=True).start()
+        locked.wait()
+        return True
+
+    def wait_loaded(self, timeout=None) -> bool:
+        """Block until a background load_state() has finished; False if it is still running after timeout."""
+        return self._loaded.wait(timeout)
+
+    def _hydrate(self, release=None):
+        """
+        Read the saved memories into episodic and semantic memory. A
+        background load passes release(*locks), called with each memory's
+        lock as soon as that memory is complete.
+        """
+        if self.db is not None:
+            # Events stay in the database; only fact texts are needed in RAM
+            facts, events, watermark = self.db.categorized_facts(), [], None
+            consolidator_state = self.db.get_meta("consolidator")
+        elif self.journal.exists():
+            # Stream the snapshot and the log written since; events go straight into columns.
+            # A forget blanks the oldest live copy of its fact (found through `rows`),
+            # and the blanks are dropped once at the end
+            facts, events, watermark, consolidator_state = [], EventColumns(), None, None
+            rows = {}  # fact -> positions of its live copies in `facts`, oldest first
+            for record in self.journal.replay():
+                op = record.get("op")
+                if op == "fact":
+                    rows.setdefault(record["fact"], deque()).append(len(facts))
+                    facts.append((record["fact"], record.get("category"), record.get("time")))
+                elif op == "forget":
+                    positions = rows.get(record["fact"])
+                    if positions:
+                        facts[positions.popleft()] = None
+                elif op == "episode":
+                    events.append(record)
+                elif op == "slept":
+                    watermark = record["watermark"]
+                elif op == "consolidator":
+                    consolidator_state = record["state"]
+            facts = [fact for fact in facts if fact is not None]
+        else:
+            # One-time import of the old single-document state file
+            state_data = json.loads(AGENT_STATE_FILE.read_text())
+            facts = [(fact, None, None) for fact in state_data.get("semantic_memory", [])]
+            events = state_data.get("episodic_memory", [])
+            watermark, consolidator_state = None, None
+
+        # Load episodic memory (and rebuild its salience / time indexes)
+        if len(events) or watermark is not None:
+            self.episodic.load(events, watermark=watermark)
+        if release is not None:
+            release(self.episodic._lock)
+
+        # Load semantic memory, without recording the replay itself in the
+        # journal; untagged facts from older state get the category their
+        # consolidation prefix names
+        self.semantic.journal = None
+        try:
+            self.semantic.add_many(
+                [fact for fact, _, _ in facts],
+                [category if category is not None else fact_category(fact) for fact, category, _ in facts],
+                [touched for _, _, touched in facts],
+            )
+            self.semantic.load_index(SEMANTIC_INDEX_FILE)
+        finally:
+            self.semantic.journal = self.journal
+        if consolidator_state is not None:
+            self.consolidator.load(consolidator_state)
+        if release is not None:
+            release(self.semantic._lock, self._sleep_lock)
+
+        if self.db is None and not self.journal.exists():
+            self.journal.compact(*self._snapshot())
 
+        # Ollama round trips and k-means, with the memories already usable
+        self.semantic.embed_missing()
+        self.semantic.train_index()
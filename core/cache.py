@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a time-to-live.
+
+    Expired entries are kept for a further `stale_ttl` seconds so callers can
+    serve them while refreshing in the background (stale-while-revalidate).
+    Empty results can be cached as negative entries with their own, shorter TTL.
+    If `path` is given the cache can be saved to and loaded from a JSON file.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600.0, negative_ttl=300.0, stale_ttl=0.0, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.path = Path(path) if path is not None else None
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Look up a key. Returns (value, fresh): fresh is False for a stale entry
+        that should be refreshed. Returns (None, False) on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, True
+                if now < expires_at + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, False
+                del self._entries[key]
+            self.misses += 1
+            return None, False
+
+    def set(self, key, value, negative=False):
+        """Store a value; negative entries (e.g. empty results) use negative_ttl."""
+        ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+    def save(self):
+        """Write unexpired entries (oldest first) to the cache file."""
+        if self.path is None:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [
+                [key, expires_at, value]
+                for key, (expires_at, value) in self._entries.items()
+                if now < expires_at + self.stale_ttl
+            ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(entries))
+
+    def load(self) -> bool:
+        """Load entries saved by save(), dropping those that expired meanwhile."""
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            entries = json.loads(self.path.read_text())
+        except ValueError:
+            return False
+        now = time.time()
+        with self._lock:
+            for key, expires_at, value in entries:
+                if now < expires_at + self.stale_ttl:
+                    self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
@@ -0,0 +1,125 @@
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+# POST endpoints that may be sent again after a gateway error: an embedding
+# has no side effects, while a generation would run (and be paid for) twice
+STATUS_RETRY_POSTS = ("/api/embed",)
+
+class HttpClient:
+    """
+    Shared HTTP client for Ollama and DuckDuckGo calls.
+    Keeps pooled keep-alive connections per host, retries failed connects and
+    (for GETs and STATUS_RETRY_POSTS) gateway errors with exponential backoff,
+    and applies a default timeout.
+    """
+
+    def __init__(self, pool_size=10, retries=2, backoff_factor=0.3, timeout=30):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """
+        The pooled session, built on first use: importing requests takes
+        about 100 ms, which a script that never reaches the network (or
+        hasn't yet) shouldn't pay at startup.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._new_session()
+        return self._session
+
+    def _new_session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.exceptions import MaxRetryError
+        from urllib3.util.retry import Retry
+
+        class GatewayRetry(Retry):
+            """Retry that only re-sends a POST after a gateway error if it is in STATUS_RETRY_POSTS."""
+
+            def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+                if (response is not None and response.status in self.status_forcelist and method == "POST"
+                        and not (url or "").split("?", 1)[0].endswith(STATUS_RETRY_POSTS)):
+                    # With raise_on_status off, the caller gets the gateway error as is
+                    raise MaxRetryError(_pool, url, "not retrying a non-idempotent POST")
+                return super().increment(method, url, response, error, _pool, _stacktrace)
+
+        # Only connection failures (nothing was sent) and gateway errors are
+        # retried: re-sending a generate request that timed out mid-read, or
+        # that a gateway answered 503, could run the generation twice
+        retry = GatewayRetry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+class AsyncHttpClient:
+    """
+    Async counterpart of HttpClient. Requests run on the default executor so
+    they share the wrapped client's connection pool with synchronous callers.
+    """
+
+    def __init__(self, client: HttpClient = None):
+        self.client = client or get_client()
+
+    async def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.client.request(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> "requests.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> "requests.Response":
+        return await self.request("POST", url, **kwargs)
+
+_default_client = None
+
+def get_client() -> HttpClient:
+    """Process-wide client used when a component is not given its own."""
+    global _default_client
+    if _default_client is None:
+        _default_client = HttpClient()
+    return _default_client
+
+def configure(**kwargs) -> HttpClient:
+    """Replace the process-wide client, e.g. configure(pool_size=32, retries=3)."""
+    global _default_client
+    if _default_client is not None:
+        _default_client.close()
+    _default_client = HttpClient(**kwargs)
+    return _default_client
@@ -0,0 +1,149 @@
+import re
+from pathlib import Path
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+# A model's tokenizer.json (e.g. from its Hugging Face repo); used when present
+TOKENIZER_FILE = Path("storage/tokenizer.json")
+
+# Tokens each dynamic section may use
+SECTION_BUDGETS = {"memory": 512, "search": 768, "conversation": 1536}
+
+# Static instructions first: identical on every turn, so Ollama can reuse its
+# cached prefill for them and only evaluate what follows
+PREAMBLE = """You are a helpful assistant with persistent long-term memory and access to current internet information.
+
+INSTRUCTIONS:
+1. Use the current date given below
+2. If search results are provided below, ALWAYS base your answer on those results
+3. Use persistent knowledge for personal facts about the user
+4. When answering, cite sources: "According to the search results...", "I found that..."
+5. Do NOT mention your training data or knowledge cutoff
+6. Do NOT say you don't have access to real-time information if search results are provided
+7. Answer naturally and conversationally
+8. Be factual and accurate
+"""
+
+# Rough BPE stand-in: words cost one token per 4 characters, punctuation one each
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+class TokenCounter:
+    """
+    Counts and truncates text in model tokens.
+
+    Uses a `tokenizers` tokenizer when one is given (a Tokenizer or a path to
+    a tokenizer.json) or TOKENIZER_FILE exists; otherwise an approximation
+    that assumes about four characters per token.
+    """
+
+    def __init__(self, tokenizer=None):
+        if tokenizer is None and Tokenizer is not None and TOKENIZER_FILE.exists():
+            tokenizer = TOKENIZER_FILE
+        if isinstance(tokenizer, (str, Path)):
+            if Tokenizer is None:
+                print("Warning: tokenizers is not installed; approximating token counts")
+                tokenizer = None
+            else:
+                tokenizer = Tokenizer.from_file(str(tokenizer))
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return sum(-(-len(piece) // 4) for piece in _PIECES.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text that fits in max_tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            return text if len(offsets) <= max_tokens else text[:offsets[max_tokens - 1][1]]
+        used = 0
+        for match in _PIECES.finditer(text):
+            used += -(-len(match.group()) // 4)
+            if used > max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+class PromptBuilder:
+    """
+    Assembles the generation prompt within a token budget per section.
+
+    The static preamble comes first, then the date, memories, search results
+    and the conversation, so consecutive turns share the longest possible
+    prefix. Memories are taken best first and whole, search results are
+    truncated, and the conversation keeps its most recent messages.
+    Token use per section of the latest prompt is kept in last_usage.
+    """
+
+    def __init__(self, budgets=None, counter=None, preamble=PREAMBLE):
+        self.budgets = dict(SECTION_BUDGETS, **(budgets or {}))
+        self.counter = counter or TokenCounter()
+        self.preamble = preamble
+        self.last_usage = {}
+
+    @property
+    def max_memories(self) -> int:
+        """Upper bound on the memories that can fit (each costs at least a few tokens)."""
+        return max(1, self.budgets["memory"] // 4)
+
+    def build(self, current_date: str, memories: list, search_results: str, conversation: list) -> str:
+        memory_lines = self._fit_memories(memories)
+        search_text = self.counter.truncate(search_results, self.budgets["search"]) if search_results else ""
+        messages = self._fit_conversation(conversation)
+
+        parts = [self.preamble, f"\nCURRENT DATE: {current_date}\n"]
+        if memory_lines:
+            parts.append(
+                "\n=== PERSISTENT KNOWLEDGE FROM ALL PAST CONVERSATIONS ===\n"
+                + "\n".join(memory_lines)
+                + "\n=== END OF PERSISTENT KNOWLEDGE ===\n"
+            )
+        if search_text:
+            parts.append("\n" + search_text + "\n")
+            # Be VERY explicit if search was performed
+            parts.append(
+                "\nIMPORTANT: I have searched the internet for current information above. You MUST use the search "
+                "results provided. Do not talk about your training data or knowledge cutoff - use the search results instead.\n"
+            )
+        parts.append("\nCURRENT CONVERSATION:\n" + "\n".join(messages) + "\n\nRespond to the user's last message.")
+
+        self.last_usage = {
+            "preamble": self.counter.count(self.preamble),
+            "memory": sum(self.counter.count(line) for line in memory_lines),
+            "search": self.counter.count(search_text),
+            "conversation": sum(self.counter.count(message) for message in messages),
+        }
+        return "".join(parts)
+
+    def _fit_memories(self, memories: list) -> list:
+        """Whole memories, best first, while they fit the memory budget."""
+        lines, used = [], 0
+        for fact in memories:
+            line = f"• {fact}"
+            cost = self.counter.count(line)
+            if used + cost > self.budgets["memory"]:
+                break
+            lines.append(line)
+            used += cost
+        return lines
+
+    def _fit_conversation(self, conversation: list) -> list:
+        """The most recent messages that fit; the newest is truncated if it alone is too long."""
+        lines, used = [], 0
+        for msg in reversed(conversation):
+            line = f"{msg['role'].upper()}: {msg['content']}"
+            cost = self.counter.count(line)
+            if used + cost > self.budgets["conversation"]:
+                if not lines:
+                    lines.append(self.counter.truncate(line, self.budgets["conversation"]))
+                break
+            lines.append(line)
+            used += cost
+        return lines[::-1]
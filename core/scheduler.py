@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def resident_memory_mb():
+    """Resident set size of this process in MB (None where it can't be read)."""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    # Peak rather than current size; bytes on macOS, KB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+class SleepScheduler:
+    """
+    Background thread that consolidates (LivingAgent.sleep) while the agent keeps serving.
+
+    A sleep is triggered when any of these holds and there are events the
+    last sleep hasn't seen:
+      - at least `every_events` new events,
+      - no new message for `idle_seconds`,
+      - the process uses more than `max_memory_mb` of resident memory.
+    Set a trigger to None to disable it. Sleeps run in the scheduler's own
+    thread; LivingAgent.sleep swaps its result into semantic memory in one
+    step, so responses are never paused for it.
+    """
+
+    def __init__(self, agent, every_events=50, idle_seconds=300.0, max_memory_mb=None,
+                 threshold=0.15, poll_interval=1.0, on_sleep=None):
+        self.agent = agent
+        self.every_events = every_events
+        self.idle_seconds = idle_seconds
+        self.max_memory_mb = max_memory_mb
+        self.threshold = threshold
+        self.poll_interval = poll_interval
+        self.on_sleep = on_sleep  # called with (reason, events, facts) after each sleep
+        self.sleeps = 0
+        self.last_reason = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sleep-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the thread, letting a sleep in progress finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def pending(self) -> int:
+        """Events stored since the last sleep."""
+        return len(self.agent.episodic.events) - self.agent.episodic.watermark
+
+    def due(self):
+        """The reason a sleep should run now, or None."""
+        pending = self.pending()
+        if pending <= 0:
+            return None
+        if self.every_events is not None and pending >= self.every_events:
+            return "events"
+        if self.idle_seconds is not None and time.time() - self.agent.last_activity >= self.idle_seconds:
+            return "idle"
+        if self.max_memory_mb is not None:
+            used = resident_memory_mb()
+            if used is not None and used >= self.max_memory_mb:
+                return "memory"
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            reason = self.due()
+            if reason is None:
+                continue
+            try:
+                events, abstracted = self.agent.sleep(threshold=self.threshold)
+            except Exception as e:
+                print(f"Warning: Background sleep failed: {e}")
+                continue
+            self.sleeps += 1
+            self.last_reason = reason
+            if self.on_sleep is not None:
+                self.on_sleep(reason, events, abstracted)
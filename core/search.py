@@ -1,6 +1,18 @@
-import requests
 import json
+import re
+import threading
 from typing import List, Dict, Optional
+from core.cache import TTLCache
+from core.http_client import HttpClient, get_client
+from core.tracing import NULL_TRACER
+from memory.keywords import KeywordMatcher
+
+# Phrases suggesting a query needs factual or current information
+SEARCH_TRIGGERS = KeywordMatcher([
+    "what is", "who is", "when", "where", "how", "latest", "current",
+    "news", "today", "2024", "2025", "2026", "weather", "stock",
+    "how do", "why", "what's new", "tell me about", "search for"
+])
 
 class InternetSearch:
     """
@@ -8,14 +20,28 @@ class InternetSearch:
     Falls back to other methods if needed.
     """
     
-    def __init__(self):
+    def __init__(self, http: Optional[HttpClient] = None, cache: Optional[TTLCache] = None):
         self.duckduckgo_url = "https://api.duckduckgo.com"
+        self.http = http or get_client()
+        # Results per normalized query; empty results are cached briefly as negatives
+        self.cache = cache if cache is not None else TTLCache(max_entries=256, ttl=3600, negative_ttl=300, stale_ttl=86400)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.tracer = NULL_TRACER  # core.tracing.Tracer for search spans and cache counters
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Cache key for a query: lowercase words, punctuation and extra spaces removed."""
+        return " ".join(re.findall(r"\w+", query.lower()))
     
-    def search_duckduckgo(self, query: str, max_results: int = 3) -> List[Dict]:
+    def search_duckduckgo(self, query: str, max_results: int = 3) -> Optional[List[Dict]]:
         """
         Search using DuckDuckGo's free API.
-        Returns list of search results with title, snippet, and URL.
+        Returns list of search results with title, snippet, and URL, or None
+        if the search failed (timeout, connection error, non-200 status).
         """
+        import requests  # imported on the first search rather than at startup
+
         try:
             params = {
                 "q": query,
@@ -24,7 +50,7 @@ class InternetSearch:
                 "skip_disambig": 1
             }
             
-            response = requests.get(self.duckduckgo_url, params=params, timeout=10)
+            response = self.http.get(self.duckduckgo_url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -51,20 +77,66 @@ class InternetSearch:
                 
                 return results[:max_results]
             else:
-                return []
+                return None
         
         except requests.exceptions.Timeout:
-            return []
+            return None
         except Exception as e:
             print(f"Warning: DuckDuckGo search failed: {e}")
-            return []
+            return None
     
+    def cached_search(self, query: str, max_results: int = 3) -> List[Dict]:
+        """
+        search_duckduckgo() behind the result cache.
+        Stale entries are returned immediately while a background thread refreshes them.
+        Only answers are cached (an empty one as a negative entry); a failed
+        search returns no results and is tried again next time.
+        """
+        key = f"{max_results}:{self.normalize_query(query)}"
+        results, fresh = self.cache.get(key)
+        if results is not None:
+            self.tracer.count("search_cache.hits" if fresh else "search_cache.stale_hits")
+            if not fresh:
+                self._refresh_in_background(key, query, max_results)
+            return results
+
+        self.tracer.count("search_cache.misses")
+        with self.tracer.span("search.duckduckgo") as span:
+            results = self.search_duckduckgo(query, max_results)
+            span["failed"] = results is None
+            span["results"] = len(results or [])
+        if results is None:
+            self.tracer.count("search.failures")
+            return []
+        self.cache.set(key, results, negative=not results)
+        return results
+
+    def _refresh_in_background(self, key: str, query: str, max_results: int):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                results = self.search_duckduckgo(query, max_results)
+                # On failure the stale entry stays until the next attempt
+                if results is not None:
+                    self.cache.set(key, results, negative=not results)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
     def search(self, query: str, max_results: int = 3) -> str:
         """
         Search the internet and format results as a readable string.
         Returns formatted search results or empty string if no results.
         """
-        results = self.search_duckduckgo(query, max_results)
+        with self.tracer.span("search") as span:
+            results = self.cached_search(query, max_results)
+            span["results"] = len(results)
         
         if not results:
             return ""
@@ -84,11 +156,6 @@ class InternetSearch:
         Determine if the query would benefit from an internet search.
         Returns True if query seems to ask for factual, current information.
         """
-        search_triggers = [
-            "what is", "who is", "when", "where", "how", "latest", "current",
-            "news", "today", "2024", "2025", "2026", "weather", "stock",
-            "how do", "why", "what's new", "tell me about", "search for"
-        ]
-        
-        query_lower = query.lower()
-        return any(trigger in query_lower for trigger in search_triggers)
+        with self.tracer.span("search.should_search") as span:
+            span["triggered"] = SEARCH_TRIGGERS.any(query.lower())
+            return span["triggered"]
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from core.state import WorkingState
+
+class Session:
+    """One conversation hosted by AgentServer: its own working memory, one turn at a time."""
+
+    def __init__(self, session_id, max_turns=8):
+        self.id = session_id
+        self.state = WorkingState(max_turns=max_turns)
+        self.lock = asyncio.Lock()
+        self.last_active = time.time()
+        self.turns = 0
+
+class AgentServer:
+    """
+    asyncio HTTP server hosting many concurrent conversations over one LivingAgent.
+
+    Every session gets its own WorkingState; episodic and semantic memory, the
+    search cache and the HTTP pool are shared. Turns run on a thread pool
+    (the agent blocks on Ollama), so sessions proceed concurrently. The
+    memories only hold their locks while updating or scoring, never during
+    an Ollama request, and POST /sleep consolidates on the pool while other
+    sessions keep talking.
+
+    Endpoints (JSON bodies and replies):
+        POST   /sessions                {"max_turns": 8}          -> {"session": id}
+        POST   /sessions/<id>/messages  {"message": ..., "stream": false}
+               -> {"response": ...}, or NDJSON lines {"token": ...} then {"done": true}
+        DELETE /sessions/<id>
+        POST   /sleep                   {"threshold": 0.15}       -> {"events": n, "facts": [...]}
+        GET    /stats
+        GET    /metrics                 per-stage latency histograms and counters
+        GET    /metrics/prometheus      the same in Prometheus text format
+    """
+
+    def __init__(self, agent, host="127.0.0.1", port=8765, workers=32, max_sessions=1000, session_ttl=3600.0):
+        self.agent = agent
+        self.host = host
+        self.port = port  # 0 picks a free port; the bound one is stored by start()
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl  # idle seconds before a session may be dropped
+        self.sessions = {}
+        self.turns = 0
+        self.sleeps = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-turn")
+        self._server = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # respond_stream_async reads Ollama's stream on the default executor
+        loop.set_default_executor(self._executor)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    # --- Sessions ---
+
+    def create_session(self, max_turns=8) -> Session:
+        self._expire_sessions()
+        session = Session(uuid.uuid4().hex, max_turns=max_turns)
+        self.sessions[session.id] = session
+        return session
+
+    def _expire_sessions(self):
+        """Drop idle sessions, and the least recently active ones beyond max_sessions."""
+        now = time.time()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_active > self.session_ttl and not session.lock.locked():
+                del self.sessions[session_id]
+        if len(self.sessions) >= self.max_sessions:
+            idle = sorted((s for s in self.sessions.values() if not s.lock.locked()), key=lambda s: s.last_active)
+            for session in idle[:len(self.sessions) - self.max_sessions + 1]:
+                del self.sessions[session.id]
+
+    async def turn(self, session: Session, message: str) -> str:
+        """Run one conversation turn for a session and return the reply."""
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            await loop.run_in_executor(self._executor, self.agent.observe, message, session.state)
+            response = await loop.run_in_executor(self._executor, self.agent.respond, session.state)
+            self._finish_turn(session)
+            return response
+
+    async def turn_stream(self, session: Session, message: str):
+        """Like turn(), yielding the reply token by token."""
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            await loop.run_in_executor(self._executor, self.agent.observe, message, session.state)
+            async for token in self.agent.respond_stream_async(session.state):
+                yield token
+            self._finish_turn(session)
+
+    def _finish_turn(self, session):
+        session.last_active = time.time()
+        session.turns += 1
+        self.turns += 1
+
+    async def sleep(self, threshold=0.15):
+        """Consolidate in a worker thread; sessions keep being served meanwhile."""
+        loop = asyncio.get_running_loop()
+        events, abstracted = await loop.run_in_executor(self._executor, self.agent.sleep, threshold)
+        self.sleeps += 1
+        return events, abstracted
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "turns": self.turns,
+            "sleeps": self.sleeps,
+            "facts": len(self.agent.semantic.facts),
+            "events": len(self.agent.episodic.events),
+            "caches": dict(self.agent.semantic.cache_stats(), search=self.agent.search.cache.stats()),
+            "lifecycle": self.agent.lifecycle.stats(),
+        }
+
+    # --- HTTP ---
+
+    async def _handle(self, reader, writer):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                await self._dispatch(method, path.split("?", 1)[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body, writer):
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return await self._send_json(writer, 400, {"error": "invalid JSON"})
+        if not isinstance(payload, dict):
+            return await self._send_json(writer, 400, {"error": "expected a JSON object"})
+        parts = [part for part in path.split("/") if part]
+
+        if method == "POST" and parts == ["sessions"]:
+            session = self.create_session(max_turns=payload.get("max_turns", 8))
+            return await self._send_json(writer, 200, {"session": session.id})
+        if method == "POST" and parts == ["sleep"]:
+            events, abstracted = await self.sleep(payload.get("threshold", 0.15))
+            return await self._send_json(writer, 200, {"events": len(events), "facts": abstracted})
+        if method == "GET" and parts == ["stats"]:
+            return await self._send_json(writer, 200, self.stats())
+        if method == "GET" and parts == ["metrics"]:
+            return await self._send_json(writer, 200, self.agent.metrics.snapshot())
+        if method == "GET" and parts == ["metrics", "prometheus"]:
+            return await self._send(writer, 200, self.agent.metrics.prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.sessions.get(parts[1])
+            if session is None:
+                return await self._send_json(writer, 404, {"error": "unknown session"})
+            if method == "DELETE" and len(parts) == 2:
+                del self.sessions[session.id]
+                return await self._send_json(writer, 200, {"session": session.id})
+            if method == "POST" and parts[2:] == ["messages"]:
+                message = payload.get("message", "")
+                if not isinstance(message, str):
+                    return await self._send_json(writer, 400, {"error": "message must be a string"})
+                if not message.strip():
+                    return await self._send_json(writer, 400, {"error": "empty message"})
+                if payload.get("stream"):
+                    return await self._send_stream(writer, self.turn_stream(session, message))
+                response = await self.turn(session, message)
+                return await self._send_json(writer, 200, {"response": response})
+        return await self._send_json(writer, 404, {"error": "not found"})
+
+    @classmethod
+    async def _send_json(cls, writer, status, payload):
+        await cls._send(writer, status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    @staticmethod
+    async def _send(writer, status, body, content_type):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}.get(status, "")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _send_stream(writer, tokens):
+        """Send tokens as chunked NDJSON, like Ollama's streaming API."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+        async for token in tokens:
+            line = json.dumps({"token": token}).encode("utf-8") + b"\n"
+            writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+        line = json.dumps({"done": True}).encode("utf-8") + b"\n"
+        writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n0\r\n\r\n")
+        await writer.drain()
@@ -2,6 +2,10 @@ class WorkingState:
     def __init__(self, max_turns=8):
         self.max_turns = max_turns
         self.buffer = []
+        # Of the latest turn, filled in by LivingAgent
+        self.timings = {}  # seconds spent per stage
+        self.timed_out = []  # stages dropped from the prompt
+        self.generation = {}  # Ollama's GENERATION_FIELDS
 
     def add(self, role, content):
         self.buffer.append({"role": role, "content": content})
@@ -0,0 +1,210 @@
+import bisect
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# The span a new span nests under; copied into worker threads with contextvars.copy_context()
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+
+class Sink:
+    """Receives finished spans, counter increments and raw measurements from a Tracer."""
+
+    def record_span(self, span: dict):
+        pass
+
+    def count(self, name: str, value=1):
+        pass
+
+    def observe(self, name: str, ms: float):
+        pass
+
+class Tracer:
+    """
+    Spans around the stages of a turn, fanned out to pluggable sinks.
+
+    span() times a block and records it with its attributes; spans opened
+    inside it (also in worker threads that copied the context) share its
+    trace id and name it as their parent. count() and observe() report
+    counters (cache hits/misses) and durations measured elsewhere (e.g.
+    Ollama's eval_duration). Without sinks everything is a no-op.
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink: Sink):
+        self.sinks.append(sink)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time the enclosed block; the yielded dict can be given more attributes."""
+        if not self.sinks:
+            yield attrs
+            return
+        parent = _current_span.get()
+        span = {
+            "trace": parent["trace"] if parent else next(_ids),
+            "span": next(_ids),
+            "parent": parent["span"] if parent else None,
+            "name": name,
+            "start": time.time(),
+        }
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except GeneratorExit:
+            # The caller stopped consuming a stream early; not a failure
+            attrs["closed"] = True
+            raise
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            span["duration_ms"] = (time.perf_counter() - started) * 1000
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator closed from another context (e.g. an abandoned stream)
+                pass
+            if error is not None:
+                span["error"] = error
+            span.update(attrs)
+            for sink in self.sinks:
+                sink.record_span(span)
+
+    def count(self, name: str, value=1):
+        for sink in self.sinks:
+            sink.count(name, value)
+
+    def observe(self, name: str, ms: float):
+        for sink in self.sinks:
+            sink.observe(name, ms)
+
+# Used by components that were not given a tracer
+NULL_TRACER = Tracer()
+
+class JSONLSink(Sink):
+    """Appends every finished span to a JSONL trace file, one object per line."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record_span(self, span: dict):
+        line = json.dumps(span, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class Histogram:
+    """Cumulative latency histogram over fixed millisecond buckets."""
+
+    BOUNDS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, ms: float):
+        self.buckets[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def quantile(self, q: float):
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                low = self.BOUNDS[i - 1] if i > 0 else 0.0
+                high = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                estimate = low + (high - low) * (rank - seen) / n
+                return min(max(estimate, self.min), self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else None,
+            "min_ms": self.min,
+            "max_ms": self.max,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.BOUNDS] + ["+Inf"], self.buckets)),
+        }
+
+class Metrics(Sink):
+    """In-process aggregates: one histogram per span name / measurement, plus counters."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def record_span(self, span: dict):
+        self.observe(span["name"], span["duration_ms"])
+
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            self._histogram(name).add(ms)
+
+    def count(self, name: str, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "histograms": {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def prometheus(self, prefix="living_model") -> str:
+        """Histograms and counters in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                metric = f"{prefix}_{_metric_name(name)}_ms"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, n in zip([str(b) for b in Histogram.BOUNDS] + ["+Inf"], h.buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {h.total}")
+                lines.append(f"{metric}_count {h.count}")
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{_metric_name(name)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
@@ -0,0 +1,269 @@
+import hashlib
+from pathlib import Path
+import numpy as np
+
+class IVFIndex:
+    """
+    Inverted-file (IVF-flat) approximate nearest-neighbour index.
+
+    Rows of an embedding matrix are clustered around k-means centroids. A query
+    scores the centroids first and then only the rows in the `nprobe` closest
+    lists, so search touches a small slice of memory instead of every fact.
+    Vectors stay in the caller's matrix; the index only stores row numbers.
+
+    `nprobe` is the recall/speed knob: nprobe >= nlist scans every list and is
+    equivalent to exact search.
+
+    add() never trains: k-means over a large memory takes seconds, so the
+    owner checks needs_training and runs fit() on its own time (outside any
+    lock; searches keep the old centroids meanwhile), then install()s the
+    result. train() does both in one call.
+    """
+
+    def __init__(self, nlist=None, nprobe=16, min_train=4096, iterations=8, seed=0):
+        self.nlist = nlist  # None picks ~4 * sqrt(rows) at training time
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self._assignment = np.zeros(0, dtype=np.int32)  # list of each row, -1 if not indexed
+        self._lists = []  # row numbers per list, with spare capacity
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._untrained = np.zeros(0, dtype=np.int64)  # rows waiting for the first training
+        self._trained_rows = 0
+        self.generation = 0  # bumped whenever rows are renumbered or reassigned, see install()
+        self._saved_generation = 0  # generation last written by save() or read by load()
+        self._fingerprint = (0, b"")  # fingerprint() of the facts at the last save() or load()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return int(self._sizes.sum())
+
+    def _reserve(self, rows: int):
+        capacity = len(self._assignment)
+        if rows > capacity:
+            assignment = np.full(max(rows, capacity * 2, 16), -1, dtype=np.int32)
+            assignment[:capacity] = self._assignment
+            self._assignment = assignment
+
+    def _nearest(self, vectors: np.ndarray, centroids=None, chunk=32768) -> np.ndarray:
+        """Index of the closest centroid (by inner product) for each vector."""
+        centroids = self.centroids if centroids is None else centroids
+        nearest = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            scores = vectors[start:start + chunk] @ centroids.T
+            nearest[start:start + chunk] = scores.argmax(axis=1)
+        return nearest
+
+    def _kmeans(self, vectors: np.ndarray, nlist: int) -> np.ndarray:
+        """Spherical k-means: centroids are kept unit length, like the vectors."""
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            nearest = self._nearest(vectors, centroids)
+            order = np.argsort(nearest, kind="stable")
+            counts = np.bincount(nearest, minlength=nlist)
+            filled = np.flatnonzero(counts)
+            sums = np.add.reduceat(vectors[order], np.concatenate(([0], np.cumsum(counts)[:-1]))[filled])
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            centroids[filled] = np.divide(sums, norms, out=centroids[filled], where=norms > 0)
+        return centroids
+
+    @property
+    def needs_training(self) -> bool:
+        """True once min_train rows are waiting for the first training, or the index has grown 4x since the last."""
+        if not self.trained:
+            return len(self._untrained) >= self.min_train
+        return len(self) > 4 * self._trained_rows
+
+    def training_rows(self) -> np.ndarray:
+        """Every row added so far: the indexed ones and those waiting for the first training."""
+        return np.union1d(np.flatnonzero(self._assignment >= 0), self._untrained)
+
+    def fit(self, matrix: np.ndarray, rows: np.ndarray, max_train=65536, chunk=32768) -> dict:
+        """
+        Cluster the given matrix rows without changing the index; only reads
+        the matrix, so it can run while searches use the current centroids.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(rows))))
+        nlist = min(nlist, len(rows))
+        rng = np.random.default_rng(self.seed)
+        sample = rows if len(rows) <= max_train else np.sort(rng.choice(rows, max_train, replace=False))
+        centroids = self._kmeans(matrix[sample], nlist)
+        nearest = np.concatenate([np.zeros(0, dtype=np.int32)] + [
+            self._nearest(matrix[rows[start:start + chunk]], centroids) for start in range(0, len(rows), chunk)
+        ])
+        return {"centroids": centroids, "rows": rows, "nearest": nearest}
+
+    def install(self, fitted: dict, matrix: np.ndarray):
+        """
+        Replace the clustering with a fit() result. Rows must not have been
+        renumbered since (compare generation); rows added since are inserted.
+        """
+        rows, nearest = fitted["rows"], fitted["nearest"]
+        added = np.setdiff1d(self.training_rows(), rows)
+        self.centroids = fitted["centroids"]
+        self._assignment[:] = -1
+        if rows.size:
+            self._reserve(int(rows.max()) + 1)
+        self._assignment[rows] = nearest
+        order = rows[np.argsort(nearest, kind="stable")]
+        self._sizes = np.bincount(nearest, minlength=len(self.centroids)).astype(np.int64)
+        self._lists = np.split(order, np.cumsum(self._sizes)[:-1])
+        self._untrained = np.zeros(0, dtype=np.int64)
+        self._trained_rows = len(rows)
+        self.generation += 1
+        if added.size:
+            self._insert(matrix, added)
+
+    def train(self, matrix: np.ndarray, rows: np.ndarray, max_train=65536):
+        """(Re)build the index from scratch over the given matrix rows."""
+        self._untrained = np.zeros(0, dtype=np.int64)
+        self._assignment[:] = -1
+        self.install(self.fit(matrix, rows, max_train), matrix)
+
+    def _insert(self, matrix: np.ndarray, rows: np.ndarray):
+        """Assign rows to their nearest list and append them."""
+        self._reserve(int(rows.max()) + 1)
+        nearest = self._nearest(matrix[rows])
+        self._assignment[rows] = nearest
+        order = np.argsort(nearest, kind="stable")
+        lists, starts = np.unique(nearest[order], return_index=True)
+        for c, members in zip(lists, np.split(rows[order], starts[1:])):
+            size = self._sizes[c]
+            if size + len(members) > len(self._lists[c]):
+                grown = np.zeros(max(size + len(members), 2 * len(self._lists[c]), 8), dtype=np.int64)
+                grown[:size] = self._lists[c][:size]
+                self._lists[c] = grown
+            self._lists[c][size:size + len(members)] = members
+            self._sizes[c] = size + len(members)
+
+    def add(self, matrix: np.ndarray, rows):
+        """
+        Index newly embedded matrix rows. Rows that are already indexed are skipped.
+        Until the first training they are only queued (see needs_training).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if not rows.size:
+            return
+        self._reserve(int(rows.max()) + 1)
+        rows = np.unique(rows[self._assignment[rows] < 0])
+        if not rows.size:
+            return
+        if not self.trained:
+            self._untrained = np.union1d(self._untrained, rows)
+            return
+        self._insert(matrix, rows)
+
+    def remap(self, mapping: np.ndarray):
+        """
+        Follow a reordering of the matrix. mapping[old_row] is the new row,
+        or -1 if the row was deleted.
+        """
+        mapping = np.asarray(mapping, dtype=np.int64)
+        self.generation += 1
+        self._fingerprint = (0, b"")
+        new_rows = int(mapping.max()) + 1 if mapping.size else 0
+        assignment = np.full(max(new_rows, 16), -1, dtype=np.int32)
+        old = min(len(mapping), len(self._assignment))
+        moved = np.flatnonzero(mapping[:old] >= 0)
+        assignment[mapping[moved]] = self._assignment[moved]
+        self._assignment = assignment
+        if not self.trained:
+            untrained = self._untrained[self._untrained < len(mapping)]
+            untrained = mapping[untrained]
+            self._untrained = np.sort(untrained[untrained >= 0])
+            return
+        for c in range(len(self._lists)):
+            members = self._lists[c][:self._sizes[c]]
+            members = members[members < len(mapping)]
+            members = mapping[members]
+            members = np.sort(members[members >= 0])
+            self._lists[c] = members
+            self._sizes[c] = len(members)
+
+    def candidates(self, matrix: np.ndarray, query: np.ndarray, nprobe=None):
+        """
+        Rows from the nprobe lists closest to the query, with their scores.
+        Rows are returned in ascending order.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        if nprobe < len(centroid_scores):
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(centroid_scores))
+        rows = np.concatenate([self._lists[c][:self._sizes[c]] for c in probe])
+        rows.sort()
+        return rows, matrix[rows] @ query
+
+    @staticmethod
+    def fingerprint(facts: list, start=(0, b"")) -> tuple:
+        """
+        Chained digest of a fact list, as (facts covered, digest). Pass an
+        earlier result as start to extend it over the facts appended since.
+        """
+        count, digest = start
+        for fact in facts[count:]:
+            digest = hashlib.sha256(digest + fact.encode("utf-8")).digest()
+        return len(facts), digest
+
+    @property
+    def unsaved(self) -> bool:
+        """Whether the clustering or row numbering changed since the last save() or load()."""
+        return self.generation != self._saved_generation
+
+    def save(self, path, facts: list):
+        """
+        Persist centroids and row assignments; lists are rebuilt on load. The
+        fingerprint is only extended over facts added since the last save, so
+        hashing costs O(facts) only after rows were renumbered.
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._fingerprint = self.fingerprint(facts, self._fingerprint)
+        np.savez(
+            path,
+            centroids=self.centroids if self.trained else np.zeros((0, 0), dtype=np.float32),
+            assignment=self._assignment[:len(facts)],
+            trained_rows=np.int64(self._trained_rows),
+            facts=np.int64(len(facts)),
+            fingerprint=np.array(self._fingerprint[1].hex()),
+        )
+        self._saved_generation = self.generation
+
+    def load(self, path, facts: list) -> bool:
+        """
+        Load a saved index if it was built over these facts, or over a prefix
+        of them: facts appended since are indexed as their embeddings arrive.
+        """
+        try:
+            with np.load(path) as data:
+                count = int(data["facts"])
+                if count > len(facts) or not data["centroids"].size:
+                    return False
+                fingerprint = self.fingerprint(facts[:count])
+                if str(data["fingerprint"]) != fingerprint[1].hex():
+                    return False
+                self.centroids = data["centroids"].astype(np.float32)
+                assignment = data["assignment"].astype(np.int32)
+                self._trained_rows = int(data["trained_rows"])
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self.generation += 1
+        self._untrained = np.zeros(0, dtype=np.int64)
+        self._assignment = np.full(max(len(assignment), 16), -1, dtype=np.int32)
+        self._assignment[:len(assignment)] = assignment
+        indexed = np.flatnonzero(assignment >= 0)
+        order = indexed[np.argsort(assignment[indexed], kind="stable")]
+        self._sizes = np.bincount(assignment[indexed], minlength=len(self.centroids)).astype(np.int64)
+        self._lists = np.split(order, np.cumsum(self._sizes)[:-1])
+        self._fingerprint = fingerprint
+        self._saved_generation = self.generation
+        return True
@@ -1,70 +1,143 @@
+from memory.keywords import KeywordMatcher
+
+# Keywords that place an episodic event in a category, checked in CATEGORY_ORDER
+CATEGORY_ORDER = ["identity", "memory", "preference", "behavior"]
+CATEGORY_KEYWORDS = KeywordMatcher.from_groups({
+    "identity": ["name", "call", "i am"],
+    "memory": ["remember", "passphrase", "phrase", "password", "secret"],
+    "preference": ["fav", "favorite", "prefer", "like", "dislike", "love", "hate"],
+    "behavior": ["always", "never", "usually", "rarely", "sometimes"],
+})
+
+# How the surviving event of each category is phrased as a semantic fact
+FACT_PREFIXES = {
+    "identity": "User stated: ",
+    "preference": "User preference: ",
+    "behavior": "User behavior/habit: ",
+    "general": "User fact: ",
+}
+
+def fact_category(fact):
+    """The category whose prefix a consolidated fact starts with (None if it has none)."""
+    if fact.startswith("User asked to remember: "):
+        return "memory"
+    return next((category for category, prefix in FACT_PREFIXES.items() if fact.startswith(prefix)), None)
+
+def _quoted_phrase(content):
+    """The text between the first and last double quote (quotes included), or None."""
+    start = content.find('"')
+    end = content.rfind('"')
+    if start != -1 and end > start:
+        return content[start:end+1]
+    return None
+
+class Consolidator:
+    """
+    Incremental consolidation of episodic events into semantic abstractions.
+
+    Keeps, between sleeps, the latest event of every category and the
+    phrases already asked to be remembered, so each sleep only has to look
+    at the events stored since the previous one. Feeding the history in any
+    number of batches (in order) ends in the same facts as feeding it all
+    at once.
+
+    If `journal` is set (a storage.journal.Journal or storage.db.MemoryDB),
+    the state is recorded after every commit as a {"op": "consolidator"} record.
+    """
+
+    def __init__(self, journal=None):
+        self.latest = {}  # category -> {"content", "time"} of its most recent event
+        self.phrases = {}  # remembered phrase -> None, in the order first seen
+        self.journal = journal
+
+    def changes(self, new_events):
+        """
+        Consolidate new events. Returns (category, fact, replaced) for every
+        fact that is new or changed, where `replaced` is the fact it
+        supersedes (None if there is none), in order of first appearance.
+        """
+        changes, state = self.plan(new_events)
+        if new_events:
+            self.commit(state)
+        return changes
+
+    def plan(self, new_events):
+        """
+        Like changes(), but leaves this consolidator untouched: returns the
+        changes and the state after them, to commit() once they have been
+        applied. Until then, the same events can be planned again.
+        """
+        latest = dict(self.latest)
+        seen = dict(self.phrases)
+        order = []  # categories in order of first appearance
+        batch = {}  # category -> latest event in this batch
+        phrases = []  # phrases first seen in this batch
+        for e in new_events:
+            content = e['content']
+
+            # Categorize the event (first matching category wins)
+            category = CATEGORY_KEYWORDS.first_label(content.lower(), CATEGORY_ORDER, default="general")
+            if category not in order:
+                order.append(category)
+
+            if category == "memory":
+                # Extract quoted phrases/passphrases, each one once
+                phrase = _quoted_phrase(content)
+                if phrase is not None and phrase not in seen:
+                    seen[phrase] = None
+                    phrases.append(phrase)
+
+            # Keep only the most recent fact per category (later events win ties)
+            elif category not in batch or e['time'] >= batch[category]['time']:
+                batch[category] = {"content": content, "time": e['time']}
+
+        changes = []
+        for category in order:
+            if category == "memory":
+                changes.extend(("memory", f"User asked to remember: {phrase}", None) for phrase in phrases)
+                continue
+            event = batch[category]
+            previous = latest.get(category)
+            if previous is not None and event['time'] < previous['time']:
+                continue
+            latest[category] = event
+            fact = FACT_PREFIXES[category] + event['content']
+            replaced = FACT_PREFIXES[category] + previous['content'] if previous is not None else None
+            if fact != replaced:
+                changes.append((category, fact, replaced))
+        return changes, {"latest": latest, "phrases": list(seen)}
+
+    def commit(self, state: dict):
+        """Adopt a state returned by plan() and record it in the journal."""
+        self.latest = state["latest"]
+        self.phrases = dict.fromkeys(state["phrases"])
+        if self.journal is not None:
+            self.journal.append({"op": "consolidator", "state": self.state()})
+
+    def update(self, new_events):
+        """Consolidate new events; returns only the facts that are new or changed."""
+        return [fact for _, fact, _ in self.changes(new_events)]
+
+    def fact(self, category):
+        return FACT_PREFIXES[category] + self.latest[category]['content']
+
+    def facts(self):
+        """Every fact currently derived from the events seen so far."""
+        return [f"User asked to remember: {phrase}" for phrase in self.phrases] + [
+            self.fact(category) for category in self.latest
+        ]
+
+    def state(self) -> dict:
+        return {"latest": self.latest, "phrases": list(self.phrases)}
+
+    def load(self, state: dict):
+        self.latest = {category: dict(event) for category, event in state.get("latest", {}).items()}
+        self.phrases = dict.fromkeys(state.get("phrases", []))
+
 def consolidate(episodic_events):
     """
     Consolidate episodic events into semantic abstractions.
     Extract meaningful facts and preferences from raw events.
     Prioritizes recent events over older ones for contradictions.
     """
-    abstractions = []
-    fact_categories = {}  # Group facts by category to detect updates
-    
-    for e in episodic_events:
-        content = e['content']
-        content_lower = content.lower()
-        timestamp = e['time']
-        
-        # Categorize the event
-        category = None
-        if any(word in content_lower for word in ["name", "call", "i am"]):
-            category = "identity"
-        elif any(word in content_lower for word in ["remember", "passphrase", "phrase", "password", "secret"]):
-            category = "memory"
-        elif any(word in content_lower for word in ["fav", "favorite", "prefer", "like", "dislike", "love", "hate"]):
-            category = "preference"
-        elif any(word in content_lower for word in ["always", "never", "usually", "rarely", "sometimes"]):
-            category = "behavior"
-        else:
-            category = "general"
-        
-        # Store fact with its category and timestamp
-        if category not in fact_categories:
-            fact_categories[category] = []
-        
-        fact_categories[category].append({
-            "content": content,
-            "time": timestamp,
-            "raw": content_lower
-        })
-    
-    # Process each category - keep the most recent fact for each topic
-    for category, facts in fact_categories.items():
-        if category == "memory":
-            # Extract quoted phrases/passphrases
-            for fact in facts:
-                if '"' in fact['content']:
-                    start = fact['content'].find('"')
-                    end = fact['content'].rfind('"')
-                    if start != -1 and end > start:
-                        phrase = fact['content'][start:end+1]
-                        abstractions.append(f"User asked to remember: {phrase}")
-        
-        elif category == "identity":
-            # Keep only the most recent identity fact
-            latest = sorted(facts, key=lambda x: x['time'])[-1]
-            abstractions.append(f"User stated: {latest['content']}")
-        
-        elif category == "preference":
-            # Keep only the most recent preference fact
-            latest = sorted(facts, key=lambda x: x['time'])[-1]
-            abstractions.append(f"User preference: {latest['content']}")
-        
-        elif category == "behavior":
-            # Keep only the most recent behavior fact
-            latest = sorted(facts, key=lambda x: x['time'])[-1]
-            abstractions.append(f"User behavior/habit: {latest['content']}")
-        
-        else:  # general
-            # Keep only the most recent general fact
-            latest = sorted(facts, key=lambda x: x['time'])[-1]
-            abstractions.append(f"User fact: {latest['content']}")
-    
-    return abstractions
+    return Consolidator().update(episodic_events)
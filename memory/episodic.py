@@ -1,15 +1,268 @@
+import heapq
+import threading
 import time
+from array import array
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+class StoredEvents:
+    """List-like view of the events kept in a storage.db.MemoryDB, read on demand."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __len__(self):
+        return self.db.count_events()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.db.events(start, max(stop - start, 0))[::step]
+            return self.db.events(start, max(stop - start, 0))
+        if index < 0:
+            index += len(self)
+        events = self.db.events(index, 1) if index >= 0 else []
+        if not events:
+            raise IndexError("event index out of range")
+        return events[0]
+
+    def __iter__(self):
+        return self.db.iter_events()
+
+    def append(self, event):
+        self.db.add_event(event["time"], event["content"], event["salience"])
+
+    def extend(self, events):
+        self.db.add_events(events)
+
+class EventColumns:
+    """
+    Events held column-wise: times and saliences in array('d') columns, the
+    texts packed back to back as UTF-8 in one bytearray with an offsets
+    column. About 24 bytes per event plus its text, instead of a dict, a
+    str and two floats. Behaves like a list of event dicts; each dict is
+    built when its row is read.
+    """
+
+    def __init__(self, events=()):
+        self.times = array("d")
+        self.saliences = array("d")
+        self._text = bytearray()
+        self._offsets = array("q", [0])  # event i's text is _text[_offsets[i]:_offsets[i + 1]]
+        self.extend(events)
+
+    def __len__(self):
+        return len(self.times)
+
+    def _row(self, i):
+        return {
+            "time": self.times[i],
+            "content": self._text[self._offsets[i]:self._offsets[i + 1]].decode("utf-8"),
+            "salience": self.saliences[i],
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def append(self, event):
+        self.times.append(event["time"])
+        self.saliences.append(event["salience"])
+        self._text += event["content"].encode("utf-8")
+        self._offsets.append(len(self._text))
+
+    def extend(self, events):
+        if isinstance(events, EventColumns):
+            # Column to column, without building any rows
+            base = len(self._text)
+            self.times.extend(events.times)
+            self.saliences.extend(events.saliences)
+            self._text += events._text
+            self._offsets.frombytes((np.frombuffer(events._offsets, dtype=np.int64)[1:] + base).tobytes())
+            return
+        for event in events:
+            self.append(event)
+
+    def without(self, rows) -> "EventColumns":
+        """A copy of these events minus the given rows."""
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = False
+        kept = EventColumns()
+        kept.times.frombytes(np.frombuffer(self.times, dtype=np.float64)[keep].tobytes())
+        kept.saliences.frombytes(np.frombuffer(self.saliences, dtype=np.float64)[keep].tobytes())
+        offsets = self._offsets
+        text = memoryview(self._text)
+        for row in np.flatnonzero(keep):
+            kept._text += text[offsets[row]:offsets[row + 1]]
+            kept._offsets.append(len(kept._text))
+        return kept
+
+    def nbytes(self) -> int:
+        """Bytes held by the columns and the text arena."""
+        return sum(column.itemsize * len(column) for column in (self.times, self.saliences, self._offsets)) + len(self._text)
 
 class EpisodicMemory:
-    def __init__(self):
-        self.events = []
+    def __init__(self, journal=None, backend=None):
+        # With a MemoryDB backend, events live in SQLite instead of RAM
+        self.backend = backend
+        self.events = StoredEvents(backend) if backend is not None else EventColumns()
+        self.journal = journal  # storage.journal.Journal that records every new event
+
+        # Number of events already handled by a sleep; later events are "new".
+        # A database also keeps the id of the last one, so new events are an id range scan
+        self.watermark, self._watermark_id = backend.watermark() if backend is not None else (0, None)
+
+        # Sorted indexes over the in-memory events: parallel key / position columns
+        self._salience_keys, self._salience_rows = array("d"), array("q")
+        self._time_keys, self._time_rows = array("d"), array("q")
+        # Sessions store events from several threads while a sleep reads them
+        self._lock = threading.RLock()
 
     def store(self, content, salience=0.1):
-        self.events.append({
-            "time": time.time(),
-            "content": content,
-            "salience": salience
-        })
-
-    def sample_for_sleep(self, threshold=0.5):
-        return [e for e in self.events if e["salience"] >= threshold]
+        with self._lock:
+            event = {
+                "time": time.time(),
+                "content": content,
+                "salience": salience
+            }
+            self.events.append(event)
+            if self.backend is None:
+                self._index(len(self.events) - 1, event)
+            if self.journal is not None:
+                self.journal.append(dict(event, op="episode"))
+
+    def load(self, events, watermark=None):
+        """Bulk-add previously stored events (dicts or an EventColumns) and rebuild the indexes once."""
+        with self._lock:
+            self.events.extend(events)
+            if watermark is not None:
+                self.watermark = watermark
+            if self.backend is None:
+                self._salience_keys, self._salience_rows = self._sorted_index(self.events.saliences)
+                self._time_keys, self._time_rows = self._sorted_index(self.events.times)
+
+    def evict(self, rows) -> list:
+        """
+        Remove events (rows before the watermark, i.e. already consolidated)
+        from RAM and return them; see memory.lifecycle. Not journaled: the
+        caller compacts the journal afterwards.
+        """
+        with self._lock:
+            rows = np.unique(np.asarray(rows, dtype=np.int64))
+            if not rows.size:
+                return []
+            if self.backend is not None or rows[-1] >= self.watermark:
+                raise ValueError("only in-memory events before the sleep watermark can be evicted")
+            events = [self.events[row] for row in rows]
+            remaining = self.events.without(rows)
+            self.events = EventColumns()
+            self.watermark -= len(rows)
+            self.load(remaining)
+            return events
+
+    @staticmethod
+    def _sorted_index(column):
+        """Keys in ascending order and their rows; a stable sort keeps equal keys in insertion order."""
+        values = np.frombuffer(column, dtype=np.float64)
+        rows = np.argsort(values, kind="stable")
+        keys, positions = array("d"), array("q")
+        keys.frombytes(values[rows].tobytes())
+        positions.frombytes(rows.astype(np.int64).tobytes())
+        return keys, positions
+
+    def _index(self, row, event):
+        # bisect_right keeps rows with equal keys in insertion order
+        pos = bisect_right(self._salience_keys, event["salience"])
+        self._salience_keys.insert(pos, event["salience"])
+        self._salience_rows.insert(pos, row)
+        pos = bisect_right(self._time_keys, event["time"])
+        self._time_keys.insert(pos, event["time"])
+        self._time_rows.insert(pos, row)
+
+    def above(self, threshold):
+        """Events with salience >= threshold, in insertion order (salience index range query)."""
+        with self._lock:
+            if self.backend is not None:
+                return self.backend.events_above(threshold)
+            start = bisect_left(self._salience_keys, threshold)
+            return [self.events[row] for row in sorted(self._salience_rows[start:])]
+
+    def new_events(self, upto=None):
+        """Events stored since the last sleep (see mark_slept), optionally only the first `upto` overall."""
+        with self._lock:
+            if self.backend is not None:
+                return self.backend.events_after(self._watermark_id, -1 if upto is None else max(upto - self.watermark, 0))
+            return self.events[self.watermark:upto]
+
+    def between(self, start=None, end=None):
+        """Events with start <= time < end, oldest first (time index range query)."""
+        with self._lock:
+            if self.backend is not None:
+                return self.backend.events_between(start, end)
+            return [self.events[row] for row in self._time_rows[slice(*self._time_range(start, end))]]
+
+    def _time_range(self, start, end):
+        lo = 0 if start is None else bisect_left(self._time_keys, start)
+        hi = len(self._time_keys) if end is None else bisect_left(self._time_keys, end)
+        return lo, max(lo, hi)
+
+    def top_salient(self, k, start=None, end=None):
+        """The k most salient events with start <= time < end, most salient first."""
+        with self._lock:
+            if self.backend is not None:
+                return self.backend.top_events(k, start, end)
+            lo, hi = self._time_range(start, end)
+            if hi - lo <= 4 * k:
+                # Small window: rank its events directly
+                saliences = self.events.saliences
+                rows = heapq.nlargest(k, self._time_rows[lo:hi], key=lambda row: (saliences[row], -row))
+                return [self.events[row] for row in rows]
+            # Large window: walk down the salience index until k events fall inside it
+            # (finishing the run of equal saliences so ties go to the oldest events)
+            low, high = self._time_keys[lo], self._time_keys[hi - 1]
+            times = self.events.times
+            top = []
+            for pos in range(len(self._salience_rows) - 1, -1, -1):
+                if len(top) >= k and self._salience_keys[pos] < top[k - 1][0]:
+                    break
+                row = self._salience_rows[pos]
+                if low <= times[row] <= high:
+                    top.append((self._salience_keys[pos], -row))
+            top.sort(reverse=True)
+            return [self.events[-negative_row] for _, negative_row in top[:k]]
+
+    def sample_for_sleep(self, threshold=0.5, since_last_sleep=False, upto=None):
+        """
+        High-salience events to consolidate. With since_last_sleep, only events
+        stored after the last mark_slept() (and before position `upto`) are considered.
+        """
+        with self._lock:
+            if since_last_sleep:
+                if self.backend is not None:
+                    return [e for e in self.new_events(upto) if e["salience"] >= threshold]
+                # Filter on the salience column; only the selected rows are built
+                end = len(self.events) if upto is None else min(upto, len(self.events))
+                saliences = self.events.saliences
+                return [self.events[row] for row in range(self.watermark, end) if saliences[row] >= threshold]
+            return self.above(threshold)
+
+    def mark_slept(self, upto=None):
+        """Move the watermark past every event stored so far (or the first `upto`)."""
+        with self._lock:
+            upto = len(self.events) if upto is None else upto
+            if self.backend is not None:
+                self._watermark_id = self.backend.advance_id(self._watermark_id, upto - self.watermark)
+                self.backend.set_watermark(upto, self._watermark_id)
+            self.watermark = upto
+            if self.journal is not None:
+                self.journal.append({"op": "slept", "watermark": self.watermark})
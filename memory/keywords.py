@@ -0,0 +1,99 @@
+import re
+
+def _trie_pattern(keywords) -> str:
+    """Regex alternation over keywords, factored into a prefix trie."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A keyword ending here makes the longer continuations optional
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """
+    Finds every keyword contained in a text in a single left-to-right pass.
+
+    All keywords are compiled into one trie-shaped regex, so each text
+    position is tested against the whole keyword set at once and the regex
+    engine skips ahead to positions that can start a keyword. Each match is
+    the longest keyword starting at its position; keywords that are
+    substrings of it are added from a precomputed table. find() therefore
+    returns exactly the keywords for which `keyword in text` holds.
+    Matching is case-sensitive; lowercase the text (and keywords) first for
+    case-insensitive use.
+    """
+
+    def __init__(self, keywords, groups=None):
+        """
+        keywords: mapping of keyword -> weight, or an iterable of keywords (weight 1.0).
+        groups: optional mapping of keyword -> labels, see from_groups().
+        """
+        if not isinstance(keywords, dict):
+            keywords = {keyword: 1.0 for keyword in keywords}
+        self.weights = dict(keywords)
+        self.keywords = list(self.weights)  # declaration order, used for scoring
+        self.groups = {keyword: tuple(labels) for keyword, labels in (groups or {}).items()}
+
+        self._rank = {keyword: rank for rank, keyword in enumerate(self.keywords)}
+        pattern = _trie_pattern(keyword for keyword in self.keywords if keyword)
+        self._pattern = re.compile(pattern if pattern else "(?!)")
+        self._implied = {
+            keyword: frozenset(other for other in self.keywords if other and other in keyword)
+            for keyword in self.keywords
+        }
+
+    @classmethod
+    def from_groups(cls, groups: dict) -> "KeywordMatcher":
+        """Build a matcher from label -> keywords; a keyword may belong to several labels."""
+        labels = {}
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                labels.setdefault(keyword, []).append(label)
+        return cls(list(labels), groups=labels)
+
+    def find(self, text: str) -> set:
+        """Every keyword that occurs in text."""
+        found = set()
+        search = self._pattern.search
+        match = search(text)
+        while match:
+            found |= self._implied[match.group()]
+            # Resume one character later so overlapping keywords are seen too
+            match = search(text, match.start() + 1)
+        return found
+
+    def any(self, text: str) -> bool:
+        """True if at least one keyword occurs in text."""
+        return self._pattern.search(text) is not None
+
+    def hits(self, text: str) -> dict:
+        """Weight of every keyword that occurs in text, in declaration order."""
+        return {keyword: self.weights[keyword] for keyword in sorted(self.find(text), key=self._rank.get)}
+
+    def score(self, text: str, base: float = 0.0) -> float:
+        """base plus the weights of all keywords found, added in declaration order."""
+        for keyword in sorted(self.find(text), key=self._rank.get):
+            base += self.weights[keyword]
+        return base
+
+    def labels(self, text: str) -> set:
+        """Labels (see from_groups) of every keyword found in text."""
+        labels = set()
+        for keyword in self.find(text):
+            labels.update(self.groups.get(keyword, ()))
+        return labels
+
+    def first_label(self, text: str, order, default=None):
+        """The first label in `order` that has a keyword in text."""
+        labels = self.labels(text)
+        return next((label for label in order if label in labels), default)
@@ -0,0 +1,186 @@
+import math
+import re
+from array import array
+from collections import Counter
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+# Words too common to say anything about which fact a query is after
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have i in is it me my of on or "
+    "that the this to was what when where which who why with you your".split()
+)
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens without stopwords."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    In-process inverted index with BM25 scoring over fact rows.
+
+    Each term keeps the slots containing it and how often, in array columns
+    that grow as facts are added; a query only touches the postings of its
+    own terms, so it needs no embedding and takes well under a millisecond
+    on a typical memory. A slot holds one added fact and maps to its current
+    row. Like memory.ann.IVFIndex it follows deletions through remap(), which
+    only rewrites that row column: deleted slots stay in the postings as
+    tombstones that search() skips until a compaction drops them.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1  # term-frequency saturation
+        self.b = b  # document-length normalization
+        self.generation = 0  # bumped whenever the slots are rebuilt, see install()
+        self.clear()
+
+    def clear(self):
+        self._postings = {}  # term -> (slots array('q'), term frequencies array('i'))
+        self._lengths = array("i")  # tokens per slot
+        self._rows = array("q")  # row of each slot, -1 once deleted
+        self._live = 0  # slots that still hold a row
+        self._total = 0  # tokens over those slots
+        self.generation += 1
+
+    def __len__(self):
+        return self._live
+
+    def add(self, row: int, text: str):
+        """Index the text of a new fact; rows are added in increasing order."""
+        terms = Counter(tokenize(text))
+        slot = len(self._rows)
+        length = sum(terms.values())
+        self._rows.append(row)
+        self._lengths.append(length)
+        self._live += 1
+        self._total += length
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("q"), array("i"))
+            postings[0].append(slot)
+            postings[1].append(tf)
+
+    def remap(self, mapping: np.ndarray):
+        """
+        Apply a row renumbering (old row -> new row, -1 for deleted rows).
+        One pass over the slots; the posting lists are left alone.
+        """
+        mapping = np.asarray(mapping, dtype=np.int64)
+        rows = np.frombuffer(self._rows, dtype=np.int64)
+        live = np.flatnonzero(rows >= 0)
+        moved = mapping[rows[live]]
+        dropped = live[moved < 0]
+        rows[live] = moved
+        self._live -= len(dropped)
+        self._total -= int(np.frombuffer(self._lengths, dtype=np.int32)[dropped].sum())
+
+    @property
+    def needs_compaction(self) -> bool:
+        """Whether tombstones have grown to a quarter of the slots."""
+        dead = len(self._rows) - self._live
+        return dead > 0 and dead * 4 >= len(self._rows)
+
+    def snapshot(self) -> dict:
+        """What compacted() works from; take it under the lock that guards add() and remap()."""
+        return {
+            "generation": self.generation,
+            "rows": np.array(self._rows, dtype=np.int64),
+            "lengths": self._lengths[:],
+            "postings": [(term, postings, len(postings[0])) for term, postings in self._postings.items()],
+        }
+
+    def compacted(self, snapshot: dict) -> dict:
+        """
+        Posting lists without the slots deleted at snapshot time, renumbered
+        densely. Reads only what the snapshot pinned, so it can run without
+        the lock while facts are added or deleted.
+        """
+        kept = np.flatnonzero(snapshot["rows"] >= 0)
+        renumber = np.full(len(snapshot["rows"]), -1, dtype=np.int64)
+        renumber[kept] = np.arange(len(kept))
+        postings = {}
+        for term, (slots, tfs), count in snapshot["postings"]:
+            moved = renumber[np.frombuffer(slots[:count], dtype=np.int64)]
+            keep = moved >= 0
+            if keep.any():
+                postings[term] = (
+                    array("q", moved[keep].tobytes()),
+                    array("i", np.frombuffer(tfs[:count], dtype=np.int32)[keep].tobytes()),
+                )
+        lengths = np.frombuffer(snapshot["lengths"], dtype=np.int32)[kept]
+        return {
+            "generation": snapshot["generation"],
+            "slots": len(snapshot["rows"]),
+            "kept": kept,
+            "lengths": array("i", lengths.tobytes()),
+            "postings": postings,
+        }
+
+    def install(self, compacted: dict) -> bool:
+        """
+        Adopt the result of compacted(). Rows deleted since the snapshot stay
+        tombstones; if facts were added or the index cleared meanwhile, nothing
+        changes and False is returned.
+        """
+        if compacted["generation"] != self.generation or compacted["slots"] != len(self._rows):
+            return False
+        rows = np.frombuffer(self._rows, dtype=np.int64)[compacted["kept"]]
+        self._rows = array("q", rows.tobytes())
+        self._lengths = compacted["lengths"]
+        self._postings = compacted["postings"]
+        self.generation += 1
+        return True
+
+    def compact(self) -> bool:
+        """Drop the tombstones in one go (snapshot, compacted and install)."""
+        return self.install(self.compacted(self.snapshot()))
+
+    def search(self, query: str, k=None):
+        """
+        Rows matching any query term and their BM25 scores, best first
+        (ties by row), at most k of them.
+        """
+        docs = self._live
+        parts = []
+        if docs:
+            lengths = np.frombuffer(self._lengths, dtype=np.int32)
+            slot_rows = np.frombuffer(self._rows, dtype=np.int64)
+            average = max(self._total / docs, 1e-9)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                slots = np.array(postings[0], dtype=np.int64)
+                tf = np.array(postings[1], dtype=np.float32)
+                if docs < len(slot_rows):
+                    # Skip the tombstones of deleted facts
+                    live = slot_rows[slots] >= 0
+                    slots, tf = slots[live], tf[live]
+                    if not slots.size:
+                        continue
+                idf = math.log(1 + (docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[slots] / average)
+                parts.append((slot_rows[slots], idf * tf * (self.k1 + 1) / (tf + norm)))
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows = np.concatenate([rows for rows, _ in parts])
+        scores = np.concatenate([scores for _, scores in parts])
+        if len(parts) > 1:
+            # Sum the scores of rows that match several terms: into a dense
+            # per-row array when the matches cover much of the index
+            if len(rows) * 8 > docs:
+                scores = np.bincount(rows, weights=scores, minlength=docs)
+                rows = np.flatnonzero(scores)
+                scores = scores[rows]
+            else:
+                rows, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+        if k is not None and k < len(rows):
+            # Keep everything tied with the k-th score so ties still go to the lowest rows
+            keep = np.flatnonzero(scores >= scores[np.argpartition(scores, -k)[-k:]].min())
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))[:k]
+        return rows[order], scores[order].astype(np.float32)
@@ -0,0 +1,382 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from memory.salience import estimate_salience
+
+# Facts of these categories are one per category (sleep replaces them) and always stay hot
+PINNED_CATEGORIES = ("identity", "preference", "behavior")
+
+DAY = 86400.0
+
+# Facts per cold segment, and how many segments one cold lookup reads
+COLD_SEGMENT_SIZE = 1024
+COLD_PROBE = 4
+
+def decay(age_seconds, half_life_days: float):
+    """Weight of something last touched `age_seconds` ago: halves every half_life_days."""
+    return 0.5 ** (np.maximum(age_seconds, 0.0) / (half_life_days * DAY))
+
+class ColdStore:
+    """
+    Compressed on-disk tier for memories evicted from RAM.
+
+    Events are written in gzip-compressed JSONL segments. Facts are kept in
+    segments of similar facts: a compressed .npz with their texts,
+    categories and last-access times, and their float16 embeddings in an
+    .npy file that lookups memory-map. manifest.json
+    lists the segments (with the time span of each event segment and the
+    centroid of each fact segment) and is replaced atomically, so a segment
+    only counts once it has been completely written.
+    """
+
+    def __init__(self, directory, segment_size=COLD_SEGMENT_SIZE, probe=COLD_PROBE):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._routing = None  # dim -> (fact segments, their centroids as rows), rebuilt on change
+
+    # --- Manifest ---
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            path = self.directory / "manifest.json"
+            self._manifest = json.loads(path.read_text()) if path.exists() else {"next": 1, "events": [], "facts": []}
+        return self._manifest
+
+    def _save_manifest(self):
+        self._routing = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / "manifest.json.tmp"
+        tmp.write_text(json.dumps(self.manifest))
+        os.replace(tmp, self.directory / "manifest.json")
+
+    def _segment_name(self, kind, suffix):
+        number = self.manifest["next"]
+        self.manifest["next"] += 1
+        return f"{kind}-{number:06d}{suffix}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "events": sum(segment["count"] for segment in self.manifest["events"]),
+                "facts": sum(segment["count"] for segment in self.manifest["facts"]),
+                "segments": len(self.manifest["events"]) + len(self.manifest["facts"]),
+                "bytes": sum(path.stat().st_size for path in self.directory.glob("*-*.*")) if self.directory.exists() else 0,
+            }
+
+    # --- Events ---
+
+    def add_events(self, events: list):
+        """Write evicted events as one new segment."""
+        if not events:
+            return
+        with self._lock:
+            name = self._segment_name("events", ".jsonl.gz")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with gzip.open(self.directory / name, "wt", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+            times = [event["time"] for event in events]
+            self.manifest["events"].append({"file": name, "count": len(events), "start": min(times), "end": max(times)})
+            self._save_manifest()
+
+    def events_between(self, start=None, end=None) -> list:
+        """Cold events with start <= time < end, oldest first; segments outside the window are skipped."""
+        with self._lock:
+            segments = [
+                segment["file"] for segment in self.manifest["events"]
+                if (start is None or segment["end"] >= start) and (end is None or segment["start"] < end)
+            ]
+        found = []
+        for name in segments:
+            with gzip.open(self.directory / name, "rt", encoding="utf-8") as f:
+                for line in f:
+                    event = json.loads(line)
+                    if (start is None or event["time"] >= start) and (end is None or event["time"] < end):
+                        found.append(event)
+        found.sort(key=lambda event: event["time"])
+        return found
+
+    # --- Facts ---
+
+    @staticmethod
+    def _strings(values) -> np.ndarray:
+        return np.frombuffer(json.dumps(values).encode("utf-8"), dtype=np.uint8)
+
+    @staticmethod
+    def _centroid(vectors, embedded):
+        """Unit mean of a segment's embeddings as base64 float16 (None without embeddings)."""
+        if not embedded.any():
+            return None
+        mean = vectors[embedded].astype(np.float32).mean(axis=0)
+        norm = np.linalg.norm(mean)
+        return base64.b64encode((mean / norm if norm > 0 else mean).astype(np.float16).tobytes()).decode("ascii")
+
+    def _groups(self, vectors, embedded) -> list:
+        """
+        Split facts into segments of at most segment_size, grouping similar
+        embeddings (a few spherical k-means rounds) so a segment's centroid
+        says which queries it can answer.
+        """
+        count = len(vectors)
+        groups = -(-count // self.segment_size)
+        if groups <= 1 or embedded.sum() < groups:
+            return [np.arange(count)]
+        rng = np.random.default_rng(0)
+        unit = vectors.astype(np.float32)
+        centroids = unit[rng.choice(np.flatnonzero(embedded), groups, replace=False)]
+        for _ in range(4):
+            nearest = (unit @ centroids.T).argmax(axis=1)
+            for group in range(groups):
+                members = unit[(nearest == group) & embedded]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[group] = mean / max(np.linalg.norm(mean), 1e-12)
+        nearest = (unit @ centroids.T).argmax(axis=1)
+        nearest[~embedded] = groups  # facts without embeddings go together
+        order = np.argsort(nearest, kind="stable")
+        bounds = np.flatnonzero(np.diff(nearest[order])) + 1
+        return [
+            chunk
+            for group in np.split(order, bounds)
+            for chunk in np.array_split(group, -(-len(group) // self.segment_size))
+        ]
+
+    def add_facts(self, facts: list):
+        """Write evicted facts, (fact, category, touched, vector or None) tuples, as new segments."""
+        if not facts:
+            return
+        dims = {len(vector) for _, _, _, vector in facts if vector is not None}
+        dim = dims.pop() if len(dims) == 1 else 0
+        vectors = np.zeros((len(facts), dim), dtype=np.float16)
+        embedded = np.zeros(len(facts), dtype=bool)
+        for i, (_, _, _, vector) in enumerate(facts):
+            if vector is not None and len(vector) == dim:
+                vectors[i] = vector
+                embedded[i] = True
+        with self._lock:
+            for rows in self._groups(vectors, embedded):
+                self._add_segment([facts[row] for row in rows], vectors[rows], embedded[rows])
+            self._save_manifest()
+
+    def _add_segment(self, facts, vectors, embedded):
+        name = self._segment_name("facts", ".npz")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Rows without an embedding stay zero, so they never score above min_score
+        np.save(self.directory / self._vector_file(name), vectors)
+        with open(self.directory / name, "wb") as f:
+            np.savez_compressed(
+                f,
+                texts=self._strings([fact for fact, _, _, _ in facts]),
+                categories=self._strings([category for _, category, _, _ in facts]),
+                touched=np.array([touched for _, _, touched, _ in facts], dtype=np.float64),
+                embedded=embedded,
+            )
+        self.manifest["facts"].append({"file": name, "count": len(facts), "centroid": self._centroid(vectors, embedded)})
+
+    @staticmethod
+    def _vector_file(name):
+        return name.replace(".npz", ".f16.npy")
+
+    def _vectors(self, name):
+        return np.load(self.directory / self._vector_file(name), mmap_mode="r")
+
+    def _read_facts(self, name):
+        with np.load(self.directory / name) as data:
+            texts = json.loads(data["texts"].tobytes())
+            categories = json.loads(data["categories"].tobytes())
+            return texts, categories, data["touched"], np.array(self._vectors(name)), data["embedded"]
+
+    def find_similar(self, query_vec: np.ndarray, k=3, min_score=0.5) -> list:
+        """
+        The (up to k) cold facts most similar to a unit query vector, with
+        cosine similarity above min_score, as (fact, category, vector, key);
+        pass {key: fact} to remove() once they are stored elsewhere. Only the
+        `probe` segments whose centroids are closest to the query are read,
+        so a lookup costs the same however much is cold.
+        """
+        with self._lock:
+            if self._routing is None:
+                self._routing = {}
+                for segment in self.manifest["facts"]:
+                    if segment.get("centroid") is not None:
+                        centroid = np.frombuffer(base64.b64decode(segment["centroid"]), dtype=np.float16)
+                        self._routing.setdefault(len(centroid), []).append((segment, centroid))
+                self._routing = {
+                    dim: ([segment for segment, _ in pairs], np.stack([centroid for _, centroid in pairs]).astype(np.float32))
+                    for dim, pairs in self._routing.items()
+                }
+            segments, centroids = self._routing.get(query_vec.shape[0], ([], None))
+            if not segments:
+                return []
+            nearest = np.argsort(-(centroids @ query_vec), kind="stable")[:self.probe]
+
+            best = []  # (score, segment, position)
+            for segment in (segments[i] for i in nearest):
+                scores = self._vectors(segment["file"]) @ query_vec
+                for position in np.flatnonzero(scores > min_score):
+                    best.append((float(scores[position]), segment["file"], int(position)))
+            found, read = [], {}
+            for _, name, position in sorted(best, key=lambda item: -item[0])[:k]:
+                if name not in read:
+                    read[name] = self._read_facts(name)
+                texts, categories, _, vectors, embedded = read[name]
+                vector = vectors[position].astype(np.float32) if embedded[position] else None
+                found.append((texts[position], categories[position], vector, (name, position)))
+            return found
+
+    def remove(self, wanted: dict) -> int:
+        """
+        Remove facts found by find_similar(), given as {key: fact}, rewriting
+        or dropping their segments. Keys whose segment has been rewritten
+        since are skipped. Returns how many facts were removed.
+        """
+        removed = 0
+        with self._lock:
+            for segment in list(self.manifest["facts"]):
+                positions = sorted(position for name, position in wanted if name == segment["file"])
+                if not positions:
+                    continue
+                texts, categories, touched, vectors, embedded = self._read_facts(segment["file"])
+                positions = [position for position in positions if texts[position] == wanted[segment["file"], position]]
+                if not positions:
+                    continue
+                self.manifest["facts"].remove(segment)
+                keep = np.ones(len(texts), dtype=bool)
+                keep[positions] = False
+                if keep.any():
+                    rows = np.flatnonzero(keep)
+                    self._add_segment(
+                        [(texts[row], categories[row], touched[row], None) for row in rows], vectors[rows], embedded[rows],
+                    )
+                self._save_manifest()
+                (self.directory / segment["file"]).unlink(missing_ok=True)
+                (self.directory / self._vector_file(segment["file"])).unlink(missing_ok=True)
+                removed += len(positions)
+        return removed
+
+class MemoryLifecycle:
+    """
+    Keeps the in-RAM (hot) memories bounded by moving their least valuable
+    items to a ColdStore.
+
+    An item's value is its salience (estimate_salience for facts) decayed by
+    the time since it was stored or last retrieved, halving every
+    half_life_days. run() evicts the lowest-valued events that a sleep has
+    already consolidated until at most max_hot_events remain, and the
+    lowest-valued facts until at most max_hot_facts remain (facts of
+    PINNED_CATEGORIES always stay). Evicted facts come back when a query
+    finds nothing relevant in RAM (SemanticMemory.cold); evicted events stay
+    readable through between().
+
+    With a database-backed EpisodicMemory the events are on disk already, so
+    only facts are evicted.
+    """
+
+    def __init__(self, episodic, semantic, cold: ColdStore, max_hot_events=100_000, max_hot_facts=20_000,
+                 half_life_days=30.0):
+        self.episodic = episodic
+        self.semantic = semantic
+        self.cold = cold
+        self.max_hot_events = max_hot_events
+        self.max_hot_facts = max_hot_facts
+        self.half_life_days = half_life_days
+        self._fact_salience = {}  # fact -> estimate_salience(fact), for the facts seen so far
+        self.evicted_events = 0
+        self.evicted_facts = 0
+
+    def event_values(self, now=None) -> np.ndarray:
+        """Decayed value of every in-RAM event, by row."""
+        now = time.time() if now is None else now
+        events = self.episodic.events
+        times = np.frombuffer(events.times, dtype=np.float64)
+        saliences = np.frombuffer(events.saliences, dtype=np.float64)
+        return saliences * decay(now - times, self.half_life_days)
+
+    def fact_values(self, now=None) -> np.ndarray:
+        """Decayed value of every hot fact, by row."""
+        now = time.time() if now is None else now
+        facts = self.semantic.facts
+        salience = np.array([self._salience(fact) for fact in facts], dtype=np.float64)
+        return salience * decay(now - self.semantic.touched_times(), self.half_life_days)
+
+    def _salience(self, fact):
+        value = self._fact_salience.get(fact)
+        if value is None:
+            value = self._fact_salience[fact] = estimate_salience(fact)
+        return value
+
+    def run(self, now=None) -> dict:
+        """Evict what is over the hot-tier limits; returns how many events and facts moved to the cold tier."""
+        now = time.time() if now is None else now
+        moved = {"events": 0, "facts": 0}
+        self.semantic.settle_promotions()
+        if self.episodic.backend is None and self.max_hot_events is not None:
+            moved["events"] = self._evict_events(now)
+        if self.max_hot_facts is not None:
+            moved["facts"] = self._evict_facts(now)
+        return moved
+
+    def _evict_events(self, now) -> int:
+        with self.episodic._lock:
+            excess = len(self.episodic.events) - self.max_hot_events
+            # Only events a sleep has consolidated may leave RAM
+            candidates = min(excess, self.episodic.watermark)
+            if candidates <= 0:
+                return 0
+            values = self.event_values(now)[:self.episodic.watermark]
+            rows = np.sort(np.argpartition(values, candidates - 1)[:candidates]) if candidates < len(values) else np.arange(len(values))
+            events = [self.episodic.events[row] for row in rows]
+        # The cold copy is written before the hot one goes, so a crash or a
+        # disk error in between loses nothing; new events are only appended,
+        # so the rows still hold these events
+        self.cold.add_events(events)
+        self.episodic.evict(rows)
+        self.evicted_events += len(events)
+        return len(events)
+
+    def _evict_facts(self, now) -> int:
+        with self.semantic._lock:
+            excess = len(self.semantic.facts) - self.max_hot_facts
+            if excess <= 0:
+                return 0
+            values = self.fact_values(now)
+            pinned = np.array([category in PINNED_CATEGORIES for _, category in self.semantic.categorized()], dtype=bool)
+            values[pinned] = np.inf
+            excess = min(excess, int((~pinned).sum()))
+            if excess <= 0:
+                return 0
+            rows = np.sort(np.argpartition(values, excess - 1)[:excess]) if excess < len(values) else np.flatnonzero(~pinned)
+            facts = self.semantic.entries(rows)
+        # Cold copy first, as for events; a fact still hot after a crash is not promoted twice
+        self.cold.add_facts(facts)
+        evicted = self.semantic.evict(rows, [fact for fact, _, _, _ in facts])
+        for fact, _, _, _ in facts:
+            self._fact_salience.pop(fact, None)
+        self.evicted_facts += evicted
+        return evicted
+
+    def between(self, start=None, end=None) -> list:
+        """Events with start <= time < end from both tiers, oldest first."""
+        hot = self.episodic.between(start, end)
+        cold = self.cold.events_between(start, end)
+        if not cold:
+            return hot
+        return sorted(cold + hot, key=lambda event: event["time"])
+
+    def stats(self) -> dict:
+        return {
+            "hot_events": len(self.episodic.events),
+            "hot_facts": len(self.semantic.facts),
+            "evicted_events": self.evicted_events,
+            "evicted_facts": self.evicted_facts,
+            "cold": self.cold.stats(),
+        }
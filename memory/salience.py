@@ -1,3 +1,25 @@
+from memory.keywords import KeywordMatcher
+
+# Explicit importance markers and their salience boosts
+IMPORTANCE_MARKERS = KeywordMatcher({
+    "remember": 0.4,
+    "remmeber": 0.4,  # Common typo
+    "membe": 0.4,  # Partial match for typos
+    "important": 0.35,
+    "prefer": 0.25,
+    "always": 0.2,
+    "never": 0.2,
+    "my name is": 0.35,
+    "i am": 0.2,
+    "i like": 0.15,
+    "i dislike": 0.15,
+    "i hate": 0.2,
+    "i love": 0.2,
+    "passphrase": 0.4,
+    "password": 0.4,
+    "secret": 0.3,
+})
+
 def estimate_salience(text: str) -> float:
     """
     Estimate how important/salient a piece of text is.
@@ -7,28 +29,7 @@ def estimate_salience(text: str) -> float:
     text_lower = text.lower()
     
     # Explicit importance markers (with higher boost for explicit "remember" requests)
-    importance_markers = [
-        ("remember", 0.4),
-        ("remmeber", 0.4),  # Common typo
-        ("membe", 0.4),  # Partial match for typos
-        ("important", 0.35),
-        ("prefer", 0.25),
-        ("always", 0.2),
-        ("never", 0.2),
-        ("my name is", 0.35),
-        ("i am", 0.2),
-        ("i like", 0.15),
-        ("i dislike", 0.15),
-        ("i hate", 0.2),
-        ("i love", 0.2),
-        ("passphrase", 0.4),
-        ("password", 0.4),
-        ("secret", 0.3),
-    ]
-    
-    for marker, boost in importance_markers:
-        if marker in text_lower:
-            score += boost
+    score = IMPORTANCE_MARKERS.score(text_lower, base=score)
     
     # Length-based scoring (longer messages often have more info)
     text_length = len(text.split())
@@ -1,89 +1,723 @@
-import requests
 import json
+import threading
+import time
+from collections import Counter
+import numpy as np
+from core.cache import TTLCache
+from core.http_client import get_client
+from core.tracing import NULL_TRACER
+from memory.lexical import tokenize
+from storage.embeddings import EmbeddingStore
+
+# How retrieve_relevant combines the keyword (BM25) index with embeddings:
+#   "vector"     embedding similarity; keywords only when the query can't be embedded
+#   "prefilter"  only the top prefilter_size keyword matches are embedding-scored
+#   "rrf"        reciprocal rank fusion of the keyword and embedding rankings
+#   "lexical"    keywords only, no embedding request at all
+FUSION_MODES = ("vector", "prefilter", "rrf", "lexical")
+
+# Rank offset in reciprocal rank fusion (the usual 60)
+RRF_K = 60
+
+# Random-hyperplane sign bits that key the retrieval-result cache: identical
+# query vectors always share a bucket, near-identical ones (cosine ~0.99) often
+RESULT_BUCKET_BITS = 32
+
+# Cold facts brought back into RAM per query that finds nothing relevant there
+PROMOTE_K = 3
 
 class SemanticMemory:
-    def __init__(self, ollama_url="http://localhost:11434", embedding_model="nomic-embed-text"):
-        self.facts = []
+    def __init__(self, ollama_url="http://localhost:11434", embedding_model="nomic-embed-text", store_dir=None, index=None, http=None, store=None,
+                 lexical=None, fusion="vector", prefilter_size=256, query_cache_size=1024, result_cache_size=256):
+        self._facts = []
+        self._categories = []  # category tag of each fact (None if untagged)
+        self._by_category = {}  # category -> rows of its facts, in insertion order
         self.ollama_url = ollama_url
+        self.http = http or get_client()
         self.embedding_model = embedding_model
-        self.embeddings_cache = {}  # Cache embeddings to avoid recomputing
-    
-    def add(self, abstraction: str):
-        self.facts.append(abstraction)
-        # Clear cache when new facts are added
-        self.embeddings_cache.clear()
-    
+        # LRU of query embeddings (fact embeddings live in the matrix and the store),
+        # so a repeated question is not embedded again
+        self.embeddings_cache = TTLCache(max_entries=query_cache_size, ttl=float("inf"))
+        # LRU of retrieval results keyed on (query bucket, version, options);
+        # version changes with every fact or vector, which invalidates older entries
+        self.result_cache = TTLCache(max_entries=result_cache_size, ttl=float("inf"))
+        self.version = 0
+        self._hyperplanes = None
+        # Fact embeddings persisted across sessions (None keeps them in memory only);
+        # any object with lookup(texts) and put_many(items) works, see storage/
+        if store is None and store_dir is not None:
+            store = EmbeddingStore(store_dir, embedding_model)
+        self.store = store
+
+        # Row i holds the unit-normalized embedding of self.facts[i]; allocated on
+        # the first embedding (when the dimension is known) and grown by doubling.
+        self._matrix = None
+        self._embedded = np.zeros(0, dtype=bool)
+        # When each fact was added or last retrieved (memory.lifecycle decays by it)
+        self._touched = np.zeros(0, dtype=np.float64)
+        # Optional cold tier (memory.lifecycle.ColdStore) searched when nothing in RAM is relevant
+        self.cold = None
+        self._promoted = {}  # cold key -> fact brought back since the last settle_promotions()
+        # Optional approximate index over the matrix rows (e.g. memory.ann.IVFIndex)
+        self.index = index
+        # Optional keyword index over the facts (memory.lexical.BM25Index), see FUSION_MODES
+        self.lexical = lexical
+        self.fusion = fusion
+        self.prefilter_size = prefilter_size
+        # Retrieval may run on a worker thread while the REPL adds or prunes facts
+        self._lock = threading.RLock()
+        self.journal = None  # storage.journal.Journal that records fact additions/removals
+        self.tracer = NULL_TRACER  # core.tracing.Tracer for retrieval spans and cache counters
+
+    @property
+    def facts(self):
+        return self._facts
+
+    @facts.setter
+    def facts(self, new_facts):
+        with self._lock:
+            new_facts = list(new_facts)
+            if self.journal is not None:
+                old, new = Counter(self._facts), Counter(new_facts)
+                for fact, count in (old - new).items():
+                    for _ in range(count):
+                        self.journal.append({"op": "forget", "fact": fact})
+                categories = dict(zip(reversed(self._facts), reversed(self._categories)))
+                for fact, count in (new - old).items():
+                    for _ in range(count):
+                        self.journal.append(self._fact_record(fact, categories.get(fact)))
+            self._reindex(new_facts)
+
+    def add(self, abstraction: str, category=None, touched=None):
+        with self._lock:
+            self._facts.append(abstraction)
+            self._categories.append(category)
+            if category is not None:
+                self._by_category.setdefault(category, []).append(len(self._facts) - 1)
+            self._reserve(len(self._facts))
+            self._embedded[len(self._facts) - 1] = False
+            self._touched[len(self._facts) - 1] = time.time() if touched is None else touched
+            self.version += 1
+            if self.lexical is not None:
+                self.lexical.add(len(self._facts) - 1, abstraction)
+            if self.journal is not None:
+                self.journal.append(self._fact_record(abstraction, category, float(self._touched[len(self._facts) - 1])))
+
+    def add_many(self, facts: list, categories=None, touched=None):
+        """Append many facts at once (categories / touched: one per fact, or None)."""
+        with self._lock:
+            for fact, category, when in zip(facts, categories or [None] * len(facts), touched or [None] * len(facts)):
+                self.add(fact, category, when)
+
+    @staticmethod
+    def _fact_record(fact, category, touched=None):
+        record = {"op": "fact", "fact": fact}
+        if category is not None:
+            record["category"] = category
+        if touched is not None:
+            record["time"] = touched
+        return record
+
+    def fact_records(self) -> list:
+        """Journal records of every fact with its category and last-access time."""
+        with self._lock:
+            return [
+                self._fact_record(fact, category, float(touched))
+                for fact, category, touched in zip(self._facts, self._categories, self._touched)
+            ]
+
+    def touched_times(self) -> np.ndarray:
+        """When each fact was added or last retrieved, by row."""
+        with self._lock:
+            return self._touched[:len(self._facts)].copy()
+
+    def entries(self, rows) -> list:
+        """(fact, category, touched, vector or None) of the given rows, to copy to a cold tier before evict()."""
+        with self._lock:
+            return [
+                (
+                    self._facts[row], self._categories[row], float(self._touched[row]),
+                    self._matrix[row].copy() if self._embedded[row] else None,
+                )
+                for row in np.unique(np.asarray(rows, dtype=np.int64))
+            ]
+
+    def evict(self, rows, facts: list) -> int:
+        """
+        Remove rows already copied to a cold tier (see memory.lifecycle),
+        skipping any that no longer hold the fact read for it. Returns how
+        many were removed.
+        """
+        with self._lock:
+            rows = np.unique(np.asarray(rows, dtype=np.int64))
+            rows = [row for row, fact in zip(rows, facts) if row < len(self._facts) and self._facts[row] == fact]
+            self._drop_rows(rows)
+            return len(rows)
+
+    def remove(self, abstraction: str):
+        """Remove every copy of a fact."""
+        with self._lock:
+            self._drop_rows([row for row, fact in enumerate(self._facts) if fact == abstraction])
+
+    def category(self, category) -> list:
+        """Facts tagged with a category, in insertion order."""
+        with self._lock:
+            return [self._facts[row] for row in self._by_category.get(category, ())]
+
+    def category_of(self, abstraction: str):
+        """Category tag of a fact (None if untagged or unknown)."""
+        with self._lock:
+            try:
+                return self._categories[self._facts.index(abstraction)]
+            except ValueError:
+                return None
+
+    def replace_category(self, category, facts: list):
+        """
+        Replace the facts of one category with `facts`. Facts that stay keep
+        their embeddings; only the dropped ones are forgotten and only the
+        new ones need embedding.
+        """
+        with self._lock:
+            rows = self._by_category.get(category, [])
+            current = Counter(self._facts[row] for row in rows)
+            wanted = Counter(facts)
+            dropped, surplus = [], current - wanted
+            for row in rows:
+                fact = self._facts[row]
+                if surplus[fact]:
+                    surplus[fact] -= 1
+                    dropped.append(row)
+            self._drop_rows(dropped)
+            for fact, count in (wanted - current).items():
+                for _ in range(count):
+                    self.add(fact, category)
+
+    def update(self, replacements=None, additions=(), embeddings=None):
+        """
+        Apply a batch of changes in one step: replace the facts of each category
+        in `replacements` (category -> facts) and add `additions` ((fact,
+        category) pairs). `embeddings` (text -> vector, see embeddings_for())
+        computed beforehand are installed in the same step, so concurrent
+        retrieval sees either the old facts or the new ones with their vectors.
+        """
+        with self._lock:
+            for category, facts in (replacements or {}).items():
+                self.replace_category(category, facts)
+            for fact, category in additions:
+                self.add(fact, category)
+            if embeddings:
+                rows = [row for row in np.flatnonzero(~self._embedded[:len(self._facts)]) if self._facts[row] in embeddings]
+                texts = [self._facts[row] for row in rows]
+                self._store_rows(rows, texts, [embeddings[text] for text in texts])
+
+    def embeddings_for(self, texts: list) -> dict:
+        """
+        Embeddings of texts that are not facts yet: from the store if it has
+        them, otherwise requested from Ollama. Returns text -> embedding for
+        the texts that could be embedded; the fact list is not touched.
+        """
+        texts = list(dict.fromkeys(texts))
+        result = {}
+        if self.store is not None and texts:
+            found, vectors = self.store.lookup(texts)
+            result.update(zip([text for text, hit in zip(texts, found) if hit], vectors))
+            texts = [text for text, hit in zip(texts, found) if not hit]
+        for text, embedding in zip(texts, self.embed_many(texts, cache=False)):
+            if embedding is not None:
+                result[text] = embedding
+        return result
+
     def all(self):
-        return self.facts.copy()
-    
-    def _get_embedding(self, text: str) -> list:
-        """Get embedding vector for text using Ollama's embedding model."""
-        if text in self.embeddings_cache:
-            return self.embeddings_cache[text]
-        
+        return self._facts.copy()
+
+    def categorized(self) -> list:
+        """(fact, category) of every fact, in order."""
+        with self._lock:
+            return list(zip(self._facts, self._categories))
+
+    def _drop_rows(self, rows):
+        """Delete facts by row, compacting the matrix, category rows and index in place."""
+        if not len(rows):
+            return
+        n = len(self._facts)
+        keep = np.ones(n, dtype=bool)
+        keep[rows] = False
+        kept = np.flatnonzero(keep)
+        mapping = np.full(n, -1, dtype=np.int64)
+        mapping[kept] = np.arange(len(kept))
+        self.version += 1
+
+        if self.journal is not None:
+            for row in sorted(rows):
+                self.journal.append({"op": "forget", "fact": self._facts[row]})
+
+        if self._matrix is not None:
+            self._matrix[:len(kept)] = self._matrix[kept]
+        self._embedded[:len(kept)] = self._embedded[kept]
+        self._embedded[len(kept):] = False
+        self._touched[:len(kept)] = self._touched[kept]
+        if self.index is not None:
+            self.index.remap(mapping)
+        if self.lexical is not None:
+            self.lexical.remap(mapping)
+
+        self._facts = [self._facts[row] for row in kept]
+        self._categories = [self._categories[row] for row in kept]
+        for category, category_rows in list(self._by_category.items()):
+            moved = mapping[category_rows]
+            moved = moved[moved >= 0]
+            if moved.size:
+                self._by_category[category] = moved.tolist()
+            else:
+                del self._by_category[category]
+
+    def _reserve(self, rows: int):
+        """Grow the embedding matrix so it can hold at least `rows` facts."""
+        capacity = len(self._embedded)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 16)
+
+        embedded = np.zeros(new_capacity, dtype=bool)
+        embedded[:capacity] = self._embedded
+        self._embedded = embedded
+
+        touched = np.zeros(new_capacity, dtype=np.float64)
+        touched[:capacity] = self._touched
+        self._touched = touched
+
+        if self._matrix is not None:
+            matrix = np.zeros((new_capacity, self._matrix.shape[1]), dtype=np.float32)
+            matrix[:capacity] = self._matrix
+            self._matrix = matrix
+
+    def _reindex(self, new_facts: list):
+        """Replace the fact list, carrying over matrix rows for facts that remain."""
+        old_rows = {}
+        for row, fact in enumerate(self._facts):
+            if self._embedded[row] and fact not in old_rows:
+                old_rows[fact] = row
+
+        source = np.array([old_rows.get(fact, -1) for fact in new_facts], dtype=np.int64)
+        capacity = max(len(new_facts), 16)
+        embedded = np.zeros(capacity, dtype=bool)
+        embedded[:len(new_facts)] = source >= 0
+
+        kept = np.flatnonzero(source >= 0)
+        if self._matrix is not None:
+            matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+            matrix[kept] = self._matrix[source[kept]]
+            self._matrix = matrix
+
+        if self.index is not None:
+            mapping = np.full(len(self._facts), -1, dtype=np.int64)
+            mapping[source[kept]] = kept
+            self.index.remap(mapping)
+
+        old_categories, old_touched = {}, {}
+        for fact, category, touched in zip(self._facts, self._categories, self._touched):
+            old_categories.setdefault(fact, category)
+            old_touched.setdefault(fact, touched)
+        now = time.time()
+        self._touched = np.zeros(capacity, dtype=np.float64)
+        self._touched[:len(new_facts)] = [old_touched.get(fact, now) for fact in new_facts]
+        self._facts = new_facts
+        self.version += 1
+        self._categories = [old_categories.get(fact) for fact in new_facts]
+        self._by_category = {}
+        for row, category in enumerate(self._categories):
+            if category is not None:
+                self._by_category.setdefault(category, []).append(row)
+        self._embedded = embedded
+        # Duplicated facts share one old row, so index any copies left out above
+        self._index_rows(kept)
+        if self.lexical is not None:
+            self.lexical.clear()
+            for row, fact in enumerate(new_facts):
+                self.lexical.add(row, fact)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector (zero stays zero)."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    @staticmethod
+    def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+        """Row-wise version of _normalize."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def _set_row(self, row: int, embedding: list) -> bool:
+        """Store a fact embedding in the matrix."""
+        vec = self._normalize(embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((len(self._embedded), vec.shape[0]), dtype=np.float32)
+        elif vec.shape[0] != self._matrix.shape[1]:
+            print(f"Warning: Embedding dimension {vec.shape[0]} does not match {self._matrix.shape[1]}")
+            return False
+        self._matrix[row] = vec
+        self._embedded[row] = True
+        self.version += 1
+        return True
+
+    def _load_stored(self, rows: np.ndarray) -> np.ndarray:
+        """Copy persisted embeddings into the matrix; return the rows still missing."""
+        if self.store is None or not rows.size:
+            return rows
+        found, vectors = self.store.lookup([self._facts[row] for row in rows])
+        if found.any():
+            if self._matrix is None:
+                self._matrix = np.zeros((len(self._embedded), vectors.shape[1]), dtype=np.float32)
+            if self._matrix.shape[1] == vectors.shape[1]:
+                self._matrix[rows[found]] = self._normalize_rows(vectors)
+                self._embedded[rows[found]] = True
+                self.version += 1
+                self._index_rows(rows[found])
+                return rows[~found]
+        return rows
+
+    def _index_rows(self, rows):
+        """Add newly embedded rows to the approximate index, if there is one."""
+        if self.index is not None and self._matrix is not None and len(rows):
+            self.index.add(self._matrix, rows)
+
+    def train_index(self) -> bool:
+        """
+        (Re)train the approximate index if it has grown enough. k-means runs
+        without the lock, so retrieval keeps answering meanwhile (exactly, or
+        from the old centroids); the result is swapped in under the lock,
+        unless rows were renumbered in between. Call it from a background
+        thread such as a sleep. Returns whether a new clustering was installed.
+        """
+        with self._lock:
+            if self.index is None or self._matrix is None or not self.index.needs_training:
+                return False
+            # A deletion or reorder renumbers rows in place (and bumps the generation);
+            # growth copies into a new matrix, leaving this one as it was
+            matrix, rows, generation = self._matrix, self.index.training_rows(), self.index.generation
+        with self.tracer.span("index.train", rows=len(rows)):
+            fitted = self.index.fit(matrix, rows)
+        with self._lock:
+            if self.index.generation != generation:
+                return False
+            self.index.install(fitted, self._matrix)
+            self.version += 1
+            return True
+
+    def compact_lexical(self) -> bool:
+        """
+        Drop the keyword index's tombstones once deletions have piled up.
+        Like train_index() the posting lists are rebuilt without the lock and
+        swapped in under it. Returns whether a compacted index was installed.
+        """
+        with self._lock:
+            if self.lexical is None or not self.lexical.needs_compaction:
+                return False
+            snapshot = self.lexical.snapshot()
+        with self.tracer.span("lexical.compact", terms=len(snapshot["postings"])):
+            compacted = self.lexical.compacted(snapshot)
+        with self._lock:
+            return self.lexical.install(compacted)
+
+    def save_index(self, path):
+        """Persist the approximate index next to the agent state, if it changed since it was saved or loaded."""
+        with self._lock:
+            if self.index is not None and self.index.unsaved:
+                self.index.save(path, self._facts)
+
+    def load_index(self, path) -> bool:
+        """Restore a saved approximate index built over the current facts (or a prefix of them)."""
+        with self._lock:
+            if self.index is None or not path.exists():
+                return False
+            self.version += 1
+            return self.index.load(path, self._facts)
+
+    def embed_missing(self, batch_size=32):
+        """
+        Embed every fact that has no vector yet.
+        Persisted embeddings are reused; the rest are requested in batches.
+        """
+        with self._lock:
+            missing = self._load_stored(np.flatnonzero(~self._embedded[:len(self._facts)]))
+            if not missing.size:
+                return
+            texts = [self._facts[row] for row in missing]
+        # Requests run without the lock so retrieval and updates aren't held up by them
+        embeddings = self.embed_many(texts, batch_size=batch_size, cache=False)
+        with self._lock:
+            self._store_rows(missing, texts, embeddings)
+
+    def _store_rows(self, rows, texts: list, embeddings: list):
+        """
+        Write freshly computed fact embeddings to the matrix and the store.
+        Rows whose fact changed while the embeddings were requested are
+        skipped (they stay missing and are embedded next time).
+        """
+        stored, embedded = [], []
+        for row, text, embedding in zip(rows, texts, embeddings):
+            if embedding is None:
+                continue
+            stored.append((text, embedding))
+            if row < len(self._facts) and self._facts[row] == text and not self._embedded[row]:
+                if self._set_row(row, embedding):
+                    embedded.append(row)
+        self._index_rows(embedded)
+        if self.store is not None and stored:
+            self.store.put_many(stored)
+
+    def embed_many(self, texts: list, batch_size=32, cache=True) -> list:
+        """
+        Get embeddings for many texts, sending up to batch_size inputs per request.
+        Returns one embedding per text, with None where embedding failed.
+        """
+        results = [self.embeddings_cache.get(text)[0] if cache else None for text in texts]
+        pending = {}  # text -> positions still waiting for an embedding
+        for i, (text, embedding) in enumerate(zip(texts, results)):
+            if embedding is None:
+                pending.setdefault(text, []).append(i)
+        if cache:
+            self.tracer.count("embedding_cache.hits", len(texts) - sum(map(len, pending.values())))
+            self.tracer.count("embedding_cache.misses", len(pending))
+
+        unique = list(pending)
+        for start in range(0, len(unique), batch_size):
+            batch = unique[start:start + batch_size]
+            with self.tracer.span("embed.request", texts=len(batch)) as span:
+                embeddings = self._request_embeddings(batch)
+                span["ok"] = embeddings is not None
+            if embeddings is None:
+                continue
+            for text, embedding in zip(batch, embeddings):
+                if cache:
+                    self.embeddings_cache.set(text, embedding)
+                for i in pending[text]:
+                    results[i] = embedding
+        return results
+
+    def _request_embeddings(self, texts: list):
+        """POST a batch of texts to Ollama's embedding endpoint."""
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.ollama_url}/api/embed",
-                json={"model": self.embedding_model, "input": text},
+                json={"model": self.embedding_model, "input": texts},
                 timeout=30
             )
             if response.status_code == 200:
-                embedding = response.json()["embeddings"][0]
-                self.embeddings_cache[text] = embedding
-                return embedding
+                return response.json()["embeddings"]
             else:
                 # Fallback to None if embedding fails
                 return None
         except Exception as e:
             print(f"Warning: Could not get embedding: {e}")
             return None
-    
-    def _cosine_similarity(self, vec1: list, vec2: list) -> float:
-        """Compute cosine similarity between two vectors."""
-        if vec1 is None or vec2 is None:
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = sum(a ** 2 for a in vec1) ** 0.5
-        magnitude2 = sum(b ** 2 for b in vec2) ** 0.5
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
-    
-    def retrieve_relevant(self, query: str, max_facts=None) -> list:
+
+    def _get_embedding(self, text: str) -> list:
+        """Get embedding vector for text using Ollama's embedding model."""
+        return self.embed_many([text])[0]
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Return the rows of the k highest scores, best first.
+        Ties are broken by row order, matching a stable descending sort.
+        """
+        if k < len(rows):
+            cutoff = scores[np.argpartition(scores, -k)[-k:]].min()
+            # Keep everything tied with the cutoff so the tie-break stays stable
+            keep = np.flatnonzero(scores >= cutoff)
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))
+        return rows[order][:k]
+
+    def retrieve_relevant(self, query: str, max_facts=None, exact=False) -> list:
         """
         Retrieve semantically relevant facts using embedding similarity.
         Uses the local LLM's embedding model for semantic understanding.
+        With an approximate index, only its candidate facts are scored unless exact=True.
+        With a keyword index, `fusion` decides how keyword matches are used, and
+        they are returned when the query can't be embedded (Ollama slow or down).
         """
-        if not self.facts:
-            return []
-        
-        # Get embedding for the query
-        query_embedding = self._get_embedding(query)
+        with self.tracer.span("retrieve", facts=len(self._facts), fusion=self.fusion) as span:
+            relevant = self._retrieve(query, max_facts, exact, span)
+            span["returned"] = len(relevant)
+            return relevant
+
+    def cache_stats(self) -> dict:
+        """Size, limit and hit rate of the query-embedding and retrieval-result caches."""
+        return {"query_embeddings": self.embeddings_cache.stats(), "retrieval_results": self.result_cache.stats()}
+
+    def _result_key(self, query, query_vec, max_facts, exact):
+        """Retrieval-result cache key: the query vector's bucket plus everything else the result depends on."""
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != query_vec.shape[0]:
+            rng = np.random.default_rng(0)
+            self._hyperplanes = rng.standard_normal((RESULT_BUCKET_BITS, query_vec.shape[0])).astype(np.float32)
+        bucket = np.packbits(self._hyperplanes @ query_vec > 0).tobytes()
+        # Keyword matches depend on the words, not the vector
+        words = tuple(sorted(set(tokenize(query)))) if self.lexical is not None and self.fusion in ("prefilter", "rrf") else ()
+        return bucket, words, self.version, max_facts, exact, self.fusion, self.prefilter_size
+
+    def _lexical_facts(self, query, max_facts) -> list:
+        """Facts ranked by BM25 alone."""
+        with self._lock, self.tracer.span("retrieve.lexical"):
+            rows, _ = self.lexical.search(query, max_facts)
+            return self._touch(rows)
+
+    def _touch(self, rows) -> list:
+        """Mark rows as just retrieved and return their facts."""
+        self._touched[rows] = time.time()
+        return [self._facts[row] for row in rows]
+
+    def _promote(self, query_vec):
+        """
+        Bring cold facts similar to the query back into RAM; returns their rows
+        and scores. The hot copies are journaled here, while their cold copies
+        stay until settle_promotions(), so a crash in between loses nothing.
+        """
+        with self.tracer.span("retrieve.promote") as span:
+            rows = []
+            for fact, category, vector, key in self.cold.find_similar(query_vec, k=PROMOTE_K, min_score=0.5):
+                self._promoted[key] = fact
+                if fact in self._facts:
+                    # Promoted already, or an eviction was interrupted after its cold copy was written
+                    continue
+                self.add(fact, category)
+                if vector is not None and self._set_row(len(self._facts) - 1, vector):
+                    rows.append(len(self._facts) - 1)
+            self._index_rows(rows)
+            span["promoted"] = len(rows)
+            rows = np.array(rows, dtype=np.int64)
+            return rows, self._matrix[rows] @ query_vec
+
+    def settle_promotions(self) -> int:
+        """
+        Drop the cold copies of facts promoted since the last call; the
+        segment rewrites run without the lock. Called from sleeps (see
+        MemoryLifecycle.run). Returns how many cold facts were removed.
+        """
+        with self._lock:
+            promoted, self._promoted = self._promoted, {}
+        if not promoted or self.cold is None:
+            return 0
+        return self.cold.remove(promoted)
+
+    def _fuse(self, vector_rows, vector_scores, lexical_rows):
+        """Reciprocal rank fusion: each ranking adds 1 / (RRF_K + rank) to a row's score."""
+        vector_rows = self._top_k(vector_rows, vector_scores, self.prefilter_size)
+        rows = np.concatenate([vector_rows, lexical_rows])
+        weights = np.concatenate([
+            1.0 / (RRF_K + 1 + np.arange(len(vector_rows))),
+            1.0 / (RRF_K + 1 + np.arange(len(lexical_rows))),
+        ])
+        rows, inverse = np.unique(rows, return_inverse=True)
+        return rows, np.bincount(inverse, weights=weights)
+
+    def _retrieve(self, query, max_facts, exact, span) -> list:
+        if self.lexical is not None and self.fusion == "lexical":
+            return self._lexical_facts(query, max_facts)
+
+        with self._lock:
+            if not self.facts:
+                return []
+            # Facts that still need vectors are embedded together with the query
+            missing = self._load_stored(np.flatnonzero(~self._embedded[:len(self._facts)]))
+            texts = [self._facts[row] for row in missing]
+
+        # The embedding request runs unlocked so concurrent sessions don't queue on it
+        query_embedding, fact_embeddings = self._embed_query(query, texts)
         if query_embedding is None:
-            # Fallback to empty list if embedding fails
+            # Embedding failed: keyword matches are better than no memories at all
+            if self.lexical is not None:
+                span["fallback"] = True
+                self.tracer.count("retrieve.lexical_fallbacks")
+                return self._lexical_facts(query, max_facts)
             return []
-        
-        # Score all facts by semantic similarity
-        scored_facts = []
-        for fact in self.facts:
-            fact_embedding = self._get_embedding(fact)
-            if fact_embedding is not None:
-                similarity = self._cosine_similarity(query_embedding, fact_embedding)
-                scored_facts.append((fact, similarity))
-        
-        # Sort by similarity score (descending)
-        scored_facts.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top matches (or all if max_facts is None)
-        max_facts = max_facts or len(scored_facts)
-        
-        # Only return facts with meaningful similarity (> 0.5)
-        # But if all facts have low similarity, return the top ones anyway
-        relevant = [fact for fact, score in scored_facts if score > 0.5]
-        if not relevant:
-            relevant = [fact for fact, score in scored_facts[:max_facts]]
-        
-        return relevant[:max_facts]
+
+        with self._lock:
+            self._store_rows(missing, texts, fact_embeddings)
+
+            if self._matrix is None:
+                return []
+            query_vec = self._normalize(query_embedding)
+            if query_vec.shape[0] != self._matrix.shape[1]:
+                return []
+
+            key = self._result_key(query, query_vec, max_facts, exact)
+            cached, _ = self.result_cache.get(key)
+            span["cached"] = cached is not None
+            if cached is not None:
+                self.tracer.count("result_cache.hits")
+                return self._touch(cached)
+            self.tracer.count("result_cache.misses")
+            rows = self._score(query, query_vec, max_facts, exact, span)
+            # Rows stay valid until the version changes, and with it the key
+            self.result_cache.set(key, rows)
+            return self._touch(rows)
+
+    def _embed_query(self, query, texts):
+        """
+        Embeddings of the query and of fact texts, in one round trip when
+        both are needed. Only the query goes through the query-embedding
+        cache: fact texts would evict cached queries and skew its hit rate.
+        """
+        if not texts:
+            return self.embed_many([query])[0], []
+        query_embedding, _ = self.embeddings_cache.get(query)
+        self.tracer.count("embedding_cache.hits" if query_embedding is not None else "embedding_cache.misses")
+        if query_embedding is not None:
+            return query_embedding, self.embed_many(texts, cache=False)
+        embeddings = self.embed_many([query] + texts, cache=False)
+        if embeddings[0] is not None:
+            self.embeddings_cache.set(query, embeddings[0])
+        return embeddings[0], embeddings[1:]
+
+    def _score(self, query, query_vec, max_facts, exact, span) -> np.ndarray:
+        """Rows of the best facts for an embedded query, best first (called with the lock held)."""
+        lexical_rows = None
+        if self.lexical is not None and self.fusion in ("prefilter", "rrf"):
+            with self.tracer.span("retrieve.lexical"):
+                lexical_rows, _ = self.lexical.search(query, self.prefilter_size)
+
+        # The similarity scan itself, apart from the embedding request
+        with self.tracer.span("retrieve.score"):
+            span["indexed"] = self.index is not None and self.index.trained and not exact
+            if self.fusion == "prefilter" and lexical_rows is not None and lexical_rows.size:
+                # Only the best keyword matches are scored
+                rows = lexical_rows[self._embedded[lexical_rows]]
+                scores = self._matrix[rows] @ query_vec
+                span["indexed"] = False
+            elif span["indexed"]:
+                rows, scores = self.index.candidates(self._matrix, query_vec)
+            else:
+                # Cosine similarity of every fact in one matrix-vector product
+                rows = np.flatnonzero(self._embedded[:len(self._facts)])
+                if rows.size == len(self._facts):
+                    scores = self._matrix[:rows.size] @ query_vec
+                else:
+                    scores = self._matrix[rows] @ query_vec
+            span["scored"] = int(rows.size)
+            if self.fusion == "rrf" and lexical_rows is not None:
+                rows, scores = self._fuse(rows, scores, lexical_rows)
+                return self._top_k(rows, scores, max_facts or len(rows))
+
+            # Only return facts with meaningful similarity (> 0.5)
+            # But if all facts have low similarity, return the top ones anyway
+            relevant = scores > 0.5
+            if not relevant.any() and self.cold is not None:
+                # Nothing relevant in RAM: bring matching facts back from the cold tier
+                promoted_rows, promoted_scores = self._promote(query_vec)
+                rows, scores = np.concatenate([rows, promoted_rows]), np.concatenate([scores, promoted_scores])
+                relevant = scores > 0.5
+            if not rows.size:
+                return rows
+            if relevant.any():
+                rows, scores = rows[relevant], scores[relevant]
+
+            # Return top matches (or all if max_facts is None)
+            return self._top_k(rows, scores, max_facts or len(rows))
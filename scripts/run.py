@@ -5,16 +5,19 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from core.agent import LivingAgent
-from memory.consolidation import consolidate
+from core.scheduler import SleepScheduler
 
 agent = LivingAgent(model="llama3.2")
 
-# Load previous state if it exists
-if agent.load_state():
-    print("Loaded previous memories and experiences.")
+# Load previous state if it exists, in the background so the prompt comes up at once
+if agent.load_state(background=True):
+    print("Loading previous memories and experiences...")
 else:
     print("Starting fresh with new agent.")
 
+# Consolidate in the background every 50 new messages or after 5 idle minutes
+scheduler = SleepScheduler(agent, every_events=50, idle_seconds=300).start()
+
 print("Agent awake. Type 'sleep' to consolidate.\n")
 
 try:
@@ -23,66 +26,22 @@ try:
         if user.lower() == "sleep":
             print("Agent entering sleep phase...")
             
-            # Consolidate episodic memories into semantic knowledge
-            events = agent.episodic.sample_for_sleep(threshold=0.15)
+            # Consolidate the episodic memories stored since the last sleep
+            events, abstracted = agent.sleep(threshold=0.15)
             if events:
-                abstracted = consolidate(events)
-                
-                # Identify which categories are being updated
-                updated_categories = set()
-                for new_fact in abstracted:
-                    if "remember:" in new_fact or "asked to remember" in new_fact:
-                        updated_categories.add("memory")
-                    elif "preference:" in new_fact:
-                        updated_categories.add("preference")
-                    elif "behavior/habit:" in new_fact:
-                        updated_categories.add("behavior")
-                    elif "identity:" in new_fact or "stated:" in new_fact:
-                        updated_categories.add("identity")
-                    elif "fact:" in new_fact:
-                        updated_categories.add("general")
-                
-                # Remove old facts in these categories to avoid conflicts
-                if updated_categories:
-                    new_semantic = []
-                    category_keywords = {
-                        "memory": ["remember", "passphrase", "phrase"],
-                        "preference": ["preference:", "favorite", "like", "dislike"],
-                        "behavior": ["behavior/habit:", "always", "never", "usually"],
-                        "identity": ["stated:", "name", "i am"],
-                        "general": ["fact:"]
-                    }
-                    
-                    for fact in agent.semantic.facts:
-                        # Check if this fact should be removed (belongs to an updated category)
-                        should_remove = False
-                        for category in updated_categories:
-                            keywords = category_keywords.get(category, [])
-                            if any(kw.lower() in fact.lower() for kw in keywords):
-                                should_remove = True
-                                break
-                        
-                        if not should_remove:
-                            new_semantic.append(fact)
-                    
-                    agent.semantic.facts = new_semantic
-                
-                # Add new consolidated facts
-                for abstraction in abstracted:
-                    agent.semantic.add(abstraction)
-                
                 print(f"Consolidated {len(events)} important events into {len(abstracted)} facts.")
                 for fact in abstracted:
                     print(f"  • {fact}")
             else:
                 print("No important events to consolidate.")
-            
-            agent.save_state()
             break
         if user.strip():
             agent.observe(user)
-            print(agent.respond())
+            for token in agent.respond_stream():
+                print(token, end="", flush=True)
+            print()
 finally:
     # Always save state on exit
+    scheduler.stop()
     agent.save_state()
     print("\nMemories saved. Agent sleeping.")
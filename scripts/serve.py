@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.agent import LivingAgent
+from core.scheduler import SleepScheduler
+from core.server import AgentServer
+
+parser = argparse.ArgumentParser(description="Serve many concurrent conversations over shared memories")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--model", default="llama3.2")
+parser.add_argument("--ollama-url", default="http://localhost:11434")
+parser.add_argument("--db", default=None, help="SQLite file for memories (default: journal files)")
+parser.add_argument("--workers", type=int, default=32, help="threads running turns")
+parser.add_argument("--sleep-every", type=int, default=50, help="consolidate after this many new messages")
+parser.add_argument("--sleep-idle", type=float, default=300.0, help="consolidate after this many idle seconds")
+parser.add_argument("--sleep-memory-mb", type=float, default=None, help="consolidate when resident memory exceeds this")
+parser.add_argument("--trace-file", default=None, help="append a JSONL span per turn stage here")
+args = parser.parse_args()
+
+agent = LivingAgent(model=args.model, ollama_url=args.ollama_url, db_path=args.db, stage_workers=args.workers,
+                    trace_file=args.trace_file)
+
+# Load previous state if it exists
+if agent.load_state():
+    print("Loaded previous memories and experiences.")
+else:
+    print("Starting fresh with new agent.")
+
+server = AgentServer(agent, host=args.host, port=args.port, workers=args.workers)
+scheduler = SleepScheduler(
+    agent, every_events=args.sleep_every, idle_seconds=args.sleep_idle, max_memory_mb=args.sleep_memory_mb,
+    on_sleep=lambda reason, events, facts: print(f"Background sleep ({reason}): {len(events)} events, {len(facts)} facts"),
+).start()
+print(f"Serving on http://{args.host}:{args.port}")
+
+try:
+    asyncio.run(server.serve_forever())
+except KeyboardInterrupt:
+    pass
+finally:
+    # Always save state on exit
+    scheduler.stop()
+    agent.save_state()
+    print("\nMemories saved.")
@@ -4,28 +4,20 @@ from pathlib import Path
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from memory.consolidation import consolidate
-from storage.db import save
 from core.agent import LivingAgent
 
+# Offline consolidation of the saved memories. Don't run it while an agent is
+# using them: running agents consolidate in the background (core/scheduler.py).
+
 # Create agent and load its current state
 agent = LivingAgent()
 agent.load_state()
 
-# Get high-salience events for consolidation (lower threshold to capture more)
-events = agent.episodic.sample_for_sleep(threshold=0.15)
+# Consolidate the high-salience events stored since the last sleep
+# (lower threshold to capture more) and save
+events, abstracted = agent.sleep(threshold=0.15)
 
 if events:
-    # Consolidate events into semantic abstractions
-    abstracted = consolidate(events)
-    
-    # Add abstractions to semantic memory
-    for abstraction in abstracted:
-        agent.semantic.add(abstraction)
-    
-    # Save updated agent state
-    agent.save_state()
-    
     print(f"Sleep complete. Consolidated {len(events)} important events into {len(abstracted)} facts.")
     print("\nLearned facts:")
     for fact in abstracted:
@@ -1,5 +1,9 @@
 import json
+import sqlite3
+import threading
+import time
 from pathlib import Path
+import numpy as np
 
 DB_FILE = Path("memory.json")
 
@@ -10,3 +14,294 @@ def load():
     if DB_FILE.exists():
         return json.loads(DB_FILE.read_text())
     return {}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodic (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    content TEXT NOT NULL,
+    salience REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodic_time ON episodic(time);
+CREATE INDEX IF NOT EXISTS episodic_salience ON episodic(salience);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS semantic (
+    id INTEGER PRIMARY KEY,
+    content TEXT NOT NULL,
+    category TEXT,
+    created REAL NOT NULL,
+    embedding_model TEXT,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS semantic_category ON semantic(category);
+CREATE INDEX IF NOT EXISTS semantic_created ON semantic(created);
+CREATE INDEX IF NOT EXISTS semantic_content ON semantic(content);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS semantic_fts USING fts5(content, content='semantic', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS semantic_fts_insert AFTER INSERT ON semantic BEGIN
+    INSERT INTO semantic_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS semantic_fts_delete AFTER DELETE ON semantic BEGIN
+    INSERT INTO semantic_fts(semantic_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+class MemoryDB:
+    """
+    SQLite storage engine for episodic events and semantic facts (WAL mode).
+
+    Episodic events are indexed by time and salience; semantic facts by
+    category and creation time, with their embeddings stored as float32
+    blobs and an FTS5 table for keyword lookup. One connection is shared
+    between threads behind a lock.
+
+    The memories talk to it through the same record interface as
+    storage.journal.Journal (append({"op": ...})), see EpisodicMemory and
+    SemanticMemory. EpisodicMemory reads events from it on demand;
+    SemanticMemory keeps every fact and vector in RAM and only mirrors
+    its changes here (loading them back at startup).
+    """
+
+    def __init__(self, path="storage/memory.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._event_count = None  # counted on first use, then kept up to date by the inserts
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get_meta(self, key, default=None):
+        """JSON value stored under key in the meta table."""
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    # --- Journal-compatible record interface ---
+
+    def append(self, record: dict):
+        op = record.get("op")
+        if op == "episode":
+            self.add_event(record["time"], record["content"], record["salience"])
+        elif op == "fact":
+            self.add_fact(record["fact"], category=record.get("category"), created=record.get("time"))
+        elif op == "forget":
+            self.remove_fact(record["fact"])
+        elif op == "slept":
+            self.set_watermark(record["watermark"], self._event_id_at(record["watermark"]))
+        elif op == "consolidator":
+            self.set_meta("consolidator", record["state"])
+
+    def flush(self):
+        """Writes are committed as they happen; nothing is buffered."""
+
+    # --- Episodic events ---
+
+    def add_event(self, time_, content, salience):
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO episodic (time, content, salience) VALUES (?, ?, ?)", (time_, content, salience)
+            )
+            if self._event_count is not None:
+                self._event_count += 1
+            return cursor.lastrowid
+
+    def add_events(self, events):
+        """Bulk insert of event dicts in one transaction."""
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.executemany(
+                "INSERT INTO episodic (time, content, salience) VALUES (?, ?, ?)",
+                ((e["time"], e["content"], e["salience"]) for e in events),
+            )
+            if self._event_count is not None:
+                self._event_count += cursor.rowcount
+
+    def count_facts(self) -> int:
+        return self._query("SELECT COUNT(*) FROM semantic")[0][0]
+
+    def count_events(self) -> int:
+        """Number of events; COUNT(*) scans the table, so it runs once and inserts keep the count."""
+        with self._lock:
+            if self._event_count is None:
+                self._event_count = self._query("SELECT COUNT(*) FROM episodic")[0][0]
+            return self._event_count
+
+    def events(self, offset=0, limit=-1) -> list:
+        """Events in insertion order."""
+        rows = self._query(
+            "SELECT time, content, salience FROM episodic ORDER BY id LIMIT ? OFFSET ?", (limit, offset)
+        )
+        return [{"time": t, "content": c, "salience": s} for t, c, s in rows]
+
+    def iter_events(self, chunk=1000):
+        """Stream every event without loading them all at once."""
+        last_id = 0
+        while True:
+            rows = self._query(
+                "SELECT id, time, content, salience FROM episodic WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)
+            )
+            if not rows:
+                return
+            for last_id, t, c, s in rows:
+                yield {"time": t, "content": c, "salience": s}
+
+    def events_above(self, threshold: float, since: float = None) -> list:
+        """Events with salience >= threshold (optionally newer than `since`), in insertion order."""
+        sql = "SELECT time, content, salience FROM episodic WHERE salience >= ?"
+        params = [threshold]
+        if since is not None:
+            sql += " AND time > ?"
+            params.append(since)
+        rows = self._query(sql + " ORDER BY id", params)
+        return [{"time": t, "content": c, "salience": s} for t, c, s in rows]
+
+    def events_after(self, last_id: int, limit: int = -1) -> list:
+        """At most `limit` events with an id above last_id, in insertion order (a primary-key range scan)."""
+        rows = self._query(
+            "SELECT time, content, salience FROM episodic WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+        )
+        return [{"time": t, "content": c, "salience": s} for t, c, s in rows]
+
+    def advance_id(self, last_id: int, count: int) -> int:
+        """Id of the count-th event after last_id (or of the newest one, if there are fewer)."""
+        if count <= 0:
+            return last_id
+        rows = self._query(
+            "SELECT MAX(id) FROM (SELECT id FROM episodic WHERE id > ? ORDER BY id LIMIT ?)", (last_id, count)
+        )
+        return rows[0][0] if rows[0][0] is not None else last_id
+
+    def _event_id_at(self, count: int) -> int:
+        """Id of the count-th event overall (0 for none); an OFFSET scan, for the rare callers without an id."""
+        return self.advance_id(0, count)
+
+    def watermark(self) -> tuple:
+        """(number of events consolidated by sleeps, id of the last of them)."""
+        count = self.get_meta("sleep_watermark", 0)
+        last_id = self.get_meta("sleep_watermark_id")
+        if last_id is None:
+            # Written before the id was kept: look it up once
+            last_id = self._event_id_at(count)
+        return count, last_id
+
+    def set_watermark(self, count: int, last_id: int):
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("sleep_watermark", json.dumps(count)), ("sleep_watermark_id", json.dumps(last_id))],
+            )
+
+    def events_between(self, start: float = None, end: float = None) -> list:
+        """Events with start <= time < end, oldest first (uses the time index)."""
+        rows = self._query(
+            "SELECT time, content, salience FROM episodic WHERE time >= ? AND time < ? ORDER BY time, id",
+            (start if start is not None else float("-inf"), end if end is not None else float("inf")),
+        )
+        return [{"time": t, "content": c, "salience": s} for t, c, s in rows]
+
+    def top_events(self, k: int, start: float = None, end: float = None) -> list:
+        """The k most salient events with start <= time < end, most salient first."""
+        rows = self._query(
+            "SELECT time, content, salience FROM episodic WHERE time >= ? AND time < ? "
+            "ORDER BY salience DESC, id LIMIT ?",
+            (start if start is not None else float("-inf"), end if end is not None else float("inf"), k),
+        )
+        return [{"time": t, "content": c, "salience": s} for t, c, s in rows]
+
+    # --- Semantic facts ---
+
+    def add_fact(self, content, category=None, created=None):
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO semantic (content, category, created) VALUES (?, ?, ?)",
+                (content, category, created if created is not None else time.time()),
+            )
+            return cursor.lastrowid
+
+    def remove_fact(self, content):
+        """Remove one copy of a fact (the oldest)."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM semantic WHERE id = (SELECT MIN(id) FROM semantic WHERE content = ?)", (content,)
+            )
+
+    def facts(self, category=None) -> list:
+        """Fact texts in insertion order, optionally for one category."""
+        if category is None:
+            rows = self._query("SELECT content FROM semantic ORDER BY id")
+        else:
+            rows = self._query("SELECT content FROM semantic WHERE category = ? ORDER BY id", (category,))
+        return [content for (content,) in rows]
+
+    def categorized_facts(self) -> list:
+        """(content, category, created) of every fact, in insertion order."""
+        return self._query("SELECT content, category, created FROM semantic ORDER BY id")
+
+    def search_facts(self, query: str, limit=10) -> list:
+        """Keyword lookup over fact texts with FTS5, best matches first."""
+        terms = " OR ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+        if not terms:
+            return []
+        rows = self._query(
+            "SELECT semantic.content FROM semantic_fts JOIN semantic ON semantic.id = semantic_fts.rowid "
+            "WHERE semantic_fts MATCH ? ORDER BY rank LIMIT ?",
+            (terms, limit),
+        )
+        return [content for (content,) in rows]
+
+class DBEmbeddingStore:
+    """
+    Embedding store backed by the blob column of MemoryDB's semantic table.
+    Same lookup()/put_many() interface as storage.embeddings.EmbeddingStore.
+    """
+
+    def __init__(self, db: MemoryDB, model: str, chunk=500):
+        self.db = db
+        self.model = model
+        self.chunk = chunk  # keeps IN (...) lists under SQLite's parameter limit
+
+    def lookup(self, texts: list):
+        stored = {}
+        unique = list(dict.fromkeys(texts))
+        for start in range(0, len(unique), self.chunk):
+            batch = unique[start:start + self.chunk]
+            rows = self.db._query(
+                f"SELECT content, embedding FROM semantic WHERE embedding_model = ? "
+                f"AND embedding IS NOT NULL AND content IN ({','.join('?' * len(batch))})",
+                [self.model] + batch,
+            )
+            for content, blob in rows:
+                stored[content] = blob
+
+        found = np.array([text in stored for text in texts], dtype=bool)
+        if not found.any():
+            return found, np.zeros((0, 0), dtype=np.float32)
+        vectors = np.stack([np.frombuffer(stored[text], dtype=np.float32) for text in texts if text in stored])
+        return found, vectors
+
+    def put_many(self, items: list):
+        with self.db._lock, self.db.conn:
+            self.db.conn.execute("BEGIN")
+            self.db.conn.executemany(
+                "UPDATE semantic SET embedding = ?, embedding_model = ? WHERE content = ?",
+                ((np.asarray(embedding, dtype=np.float32).tobytes(), self.model, text) for text, embedding in items),
+            )
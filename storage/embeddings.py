@@ -0,0 +1,130 @@
+import hashlib
+import re
+from itertools import takewhile
+from pathlib import Path
+import numpy as np
+
+class EmbeddingStore:
+    """
+    Append-only on-disk embedding store keyed by (embedding model, content hash).
+
+    Each model gets a raw float32 vector file plus an index file listing the
+    content hash of every row. The vector file is memory-mapped, so opening a
+    store with many thousands of embeddings neither copies nor re-embeds them.
+    """
+
+    HASH_LENGTH = 64  # sha256 hex digest
+
+    def __init__(self, directory, model: str):
+        directory = Path(directory)
+        safe_model = re.sub(r"[^A-Za-z0-9._-]", "_", model)
+        self.model = model
+        self.vectors_file = directory / f"{safe_model}.f32"
+        self.index_file = directory / f"{safe_model}.idx"
+        self.dim = None
+        self._rows = {}  # content hash -> row in the vector file
+        self._mapped = None
+        self._next_row = 0
+        self._load_index()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return self.key(text) in self._rows
+
+    def _load_index(self):
+        """Read the row index, ignoring rows whose vectors never reached disk."""
+        if not self.index_file.exists():
+            return
+        lines = self.index_file.read_text().splitlines()
+        if not lines or not lines[0].isdigit():
+            return
+        self.dim = int(lines[0])
+
+        # A crash between the two appends can leave the files out of step
+        row_bytes = 4 * self.dim
+        stored_bytes = self.vectors_file.stat().st_size if self.vectors_file.exists() else 0
+        stored_rows = stored_bytes // row_bytes
+        indexed = list(takewhile(lambda digest: len(digest) == self.HASH_LENGTH, lines[1:stored_rows + 1]))
+        if len(lines) - 1 != len(indexed) or stored_bytes != len(indexed) * row_bytes:
+            self._truncate(indexed)
+        for row, digest in enumerate(indexed):
+            self._rows.setdefault(digest, row)
+        self._next_row = len(indexed)
+
+    def _truncate(self, indexed: list):
+        """Cut both files back to the rows that were fully written."""
+        with open(self.vectors_file, "r+b" if self.vectors_file.exists() else "wb") as f:
+            f.truncate(len(indexed) * 4 * self.dim)
+        self.index_file.write_text("".join(f"{line}\n" for line in [str(self.dim)] + indexed))
+
+    def vectors(self) -> np.ndarray:
+        """Read-only memory map over every stored vector (row-aligned with the index)."""
+        rows = self._next_row
+        if not rows:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._mapped is None or self._mapped.shape[0] != rows:
+            self._mapped = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mapped
+
+    def rows_for(self, texts: list) -> np.ndarray:
+        """Row of each text in vectors(), or -1 where it has not been stored."""
+        return np.array([self._rows.get(self.key(text), -1) for text in texts], dtype=np.int64)
+
+    def lookup(self, texts: list):
+        """
+        Stored embeddings for texts: (found, vectors) where found is a bool mask
+        over texts and vectors holds one row per found text.
+        """
+        rows = self.rows_for(texts) if self._rows else np.full(len(texts), -1, dtype=np.int64)
+        found = rows >= 0
+        if not found.any():
+            return found, np.zeros((0, self.dim or 0), dtype=np.float32)
+        return found, self.vectors()[rows[found]]
+
+    def get(self, text: str):
+        """Stored embedding for text, or None."""
+        row = self._rows.get(self.key(text))
+        if row is None:
+            return None
+        return self.vectors()[row]
+
+    def put(self, text: str, embedding):
+        """Append an embedding unless one is already stored for this text."""
+        self.put_many([(text, embedding)])
+
+    def put_many(self, items: list):
+        """Append (text, embedding) pairs, skipping texts that are already stored."""
+        digests, vectors, seen = [], [], set()
+        for text, embedding in items:
+            digest = self.key(text)
+            if digest in self._rows or digest in seen:
+                continue
+            seen.add(digest)
+            vec = np.asarray(embedding, dtype=np.float32)
+            if self.dim is None:
+                self.dim = vec.shape[0]
+                self.index_file.parent.mkdir(parents=True, exist_ok=True)
+                self.index_file.write_text(f"{self.dim}\n")
+                self.vectors_file.write_bytes(b"")
+            elif vec.shape[0] != self.dim:
+                print(f"Warning: Not storing embedding of dimension {vec.shape[0]} (store uses {self.dim})")
+                continue
+            digests.append(digest)
+            vectors.append(vec)
+        if not digests:
+            return
+
+        # Vectors first, then their index lines, so a torn write never indexes garbage
+        with open(self.vectors_file, "ab") as f:
+            f.write(np.stack(vectors).tobytes())
+        with open(self.index_file, "a") as f:
+            f.write("".join(digest + "\n" for digest in digests))
+        for digest in digests:
+            self._rows[digest] = self._next_row
+            self._next_row += 1
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from itertools import islice
+from pathlib import Path
+
+# Lines parsed per json.loads call on replay: a batch is decoded as one JSON
+# array, several times faster than a call per line on a large snapshot
+READ_BATCH = 1000
+
+class Journal:
+    """
+    Append-only JSONL write-ahead log of memory changes, compacted into a snapshot.
+
+    Every change is appended as one JSON line with an increasing sequence
+    number, so saving costs O(changes) rather than O(history). compact()
+    writes a fresh snapshot (atomically, via a temp file) and empties the log;
+    the snapshot records the last sequence number it contains, so a crash
+    between the two steps never replays a record twice. A torn final line
+    from a crash mid-append is dropped on replay.
+    """
+
+    def __init__(self, snapshot_path, log_path, compact_every=1000, fsync=False):
+        self.snapshot_path = Path(snapshot_path)
+        self.log_path = Path(log_path)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.seq = 0
+        self.pending = 0  # records appended since the last compaction
+        self._file = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self.snapshot_path.exists() or self.log_path.exists()
+
+    def _open(self):
+        if self._file is None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.log_path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, record: dict):
+        """Write one change record to the log."""
+        with self._lock:
+            self.seq += 1
+            line = json.dumps(dict(record, seq=self.seq))
+            f = self._open()
+            f.write(line + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self.pending += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def replay(self):
+        """Yield snapshot records, then logged records newer than the snapshot."""
+        snapshot_seq = 0
+        for record in self._read(self.snapshot_path, repair=False):
+            if record.get("op") == "snapshot":
+                snapshot_seq = record.get("seq", 0)
+                continue
+            yield record
+        self.seq = snapshot_seq
+
+        for record in self._read(self.log_path, repair=True):
+            seq = record.get("seq", 0)
+            if seq <= snapshot_seq:
+                continue
+            self.seq = max(self.seq, seq)
+            self.pending += 1
+            yield record
+
+    def _read(self, path: Path, repair: bool):
+        """Stream JSON lines, stopping at the first incomplete one."""
+        if not path.exists():
+            return
+        good_bytes = 0
+        with open(path, "rb") as f:
+            while True:
+                lines = list(islice(f, READ_BATCH))
+                if not lines:
+                    return
+                records = self._parse(lines)
+                good_bytes += sum(len(line) for line in lines[:len(records)])
+                yield from records
+                if len(records) < len(lines):
+                    break
+        if repair:
+            # Cut the torn tail so new appends start on a clean line
+            self.close()
+            with open(path, "r+b") as f:
+                f.truncate(good_bytes)
+
+    @staticmethod
+    def _parse(lines: list) -> list:
+        """Records of complete lines, up to the first bad one."""
+        if lines[-1].endswith(b"\n"):
+            # Whole batch as one JSON array
+            try:
+                records = json.loads(b"[" + b",".join(lines) + b"]")
+                if len(records) == len(lines) and all(isinstance(record, dict) for record in records):
+                    return records
+            except ValueError:
+                pass
+        records = []
+        for line in lines:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        return records
+
+    def compact(self, records, seq=None):
+        """
+        Replace the snapshot with `records` and empty the log. If the records
+        only reflect changes up to sequence number `seq`, later log records are
+        kept (changes appended while the records were being gathered).
+        """
+        with self._lock:
+            snapshot_seq = self.seq if seq is None else seq
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"op": "snapshot", "seq": snapshot_seq}) + "\n")
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            newer = [] if snapshot_seq >= self.seq else [
+                record for record in self._read(self.log_path, repair=False) if record.get("seq", 0) > snapshot_seq
+            ]
+            with open(self.log_path, "w", encoding="utf-8") as f:
+                for record in newer:
+                    f.write(json.dumps(record) + "\n")
+            self.pending = len(newer)
+
+    def maybe_compact(self, snapshot) -> bool:
+        """
+        Compact once compact_every records have accumulated in the log.
+        snapshot() returns (records, seq) as taken by compact(); it is only
+        called when compaction is due.
+        """
+        if self.pending < self.compact_every:
+            return False
+        self.compact(*snapshot())
+        return True
@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from benchmarks.stub_server import StubOllama
+from core.http_client import HttpClient
+from memory.semantic import SemanticMemory
+
+FACTS = [f"User fact: remembered detail {i}" for i in range(100)]
+
+def memory(stub):
+    return SemanticMemory(ollama_url=stub.url, http=HttpClient())
+
+def test_batched_vectors_match_single_requests():
+    with StubOllama(dim=64) as stub:
+        single = [memory(stub)._get_embedding(fact) for fact in FACTS]
+        assert stub.requests == len(FACTS)
+
+        stub.requests = 0
+        batched = memory(stub).embed_many(FACTS, batch_size=32, cache=False)
+        assert stub.requests == 4  # ceil(100 / 32)
+
+    assert len(batched) == len(single)
+    for one, many in zip(single, batched):
+        np.testing.assert_array_equal(np.asarray(one), np.asarray(many))
+
+def test_embed_missing_and_retrieval_request_counts():
+    with StubOllama(dim=64) as stub:
+        semantic = memory(stub)
+        semantic.add_many(FACTS + FACTS[:10])  # duplicates are embedded once
+        semantic.embed_missing(batch_size=32)
+        assert stub.requests == 4
+        assert semantic._embedded[:len(semantic.facts)].all()
+
+        # Every fact already has a vector: a query costs one request, a repeated one none
+        stub.requests = 0
+        assert semantic.retrieve_relevant(FACTS[7], 3)[0] == FACTS[7]
+        assert semantic.retrieve_relevant(FACTS[7], 3)[0] == FACTS[7]
+        assert stub.requests == 1
+
+def test_missing_facts_stay_out_of_the_query_cache():
+    with StubOllama(dim=64) as stub:
+        semantic = memory(stub)
+        semantic.add_many(FACTS)
+        # The first query embeds every fact in the same round trip
+        semantic.retrieve_relevant("what do you remember", 3)
+        assert stub.requests == 4  # ceil(101 / 32)
+        assert len(semantic.embeddings_cache) == 1
+        assert semantic.embeddings_cache.get("what do you remember")[0] is not None